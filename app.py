@@ -1,46 +1,56 @@
-from flask import Flask, render_template_string, request, jsonify
-import requests
+from flask import Flask, request, jsonify, redirect, url_for, g, stream_with_context
+import atexit
+import click
+import json
 import os
+import uuid
+import requests
+from catalog import CatalogStore
+from decks import (DeckRules, DeckError, DECK_FORMATS, MAX_BATCH, MAX_LINE,
+                   read_deck, write_deck, encode_deck, to_ydk)
+from compression import Payload, MIN_SIZE, ENCODINGS, compress, negotiate
+from images import ImageCache, ImagePrefetcher, THUMBNAIL_SIZES, prefetch
+from players import ClickBuffer, PlayerError, MAX_IMPORT_VALUE, MAX_INTEGER, open_player_store
+from pricing import PriceTable, SORT_KEYS
+from sprites import SpriteLayout, SpriteSheets
+from search import NameIndex, SearchIndex, Suggester, QueryCache, encode_cursor, decode_cursor
 app = Flask(__name__)
 
 # ------------------------
-# Fetch all cards at startup
+# Load all cards at startup (local snapshot, refreshed in the background)
 # ------------------------
-API_URL = "https://db.ygoprodeck.com/api/v7/cardinfo.php"
-response = requests.get(API_URL)
-all_cards = []
-
-# Godly tier cards - 3,500,000 coins each
-godly_tier_cards = ["Obelisk the Tormentor", "The Winged Dragon of Ra", "Slifer the Sky Dragon", "Pot of Greed"]
-
-def normalize_type(card_type):
-    card_type = card_type.lower()
-    if 'monster' in card_type:
-        if 'xyz' in card_type:
-            return 'XYZ'
-        elif 'synchro' in card_type:
-            return 'Synchro'
-        elif 'fusion' in card_type:
-            return 'Fusion'
-        elif 'ritual' in card_type:
-            return 'Ritual'
-        else:
-            return 'Normal'
-    elif 'spell' in card_type:
-        return 'Spell'
-    elif 'trap' in card_type:
-        return 'Trap'
-    return 'Unknown'
-
-if response.status_code == 200:
-    for card_data in response.json().get("data", []):
-        all_cards.append({
-            "name": card_data.get("name", "Unknown"),
-            "type": normalize_type(card_data.get("type", "Unknown")),
-            "atk": card_data.get("atk", 0) or 0,
-            "defense": card_data.get("def", "N/A"),
-            "img": card_data["card_images"][0]["image_url"]
-        })
+catalog_store = CatalogStore()
+catalog_store.derive("search", lambda catalog: SearchIndex(catalog.cards))
+catalog_store.derive("prices", lambda catalog: PriceTable(catalog.cards))
+catalog_store.derive("names", lambda catalog: NameIndex(catalog.cards))
+catalog_store.derive("suggest", lambda catalog: Suggester(catalog.cards, catalog.derived["names"]))
+
+catalog_store.derive("decks", lambda catalog: DeckRules(catalog, catalog.derived["prices"]))
+catalog_store.derive("sprites", lambda catalog: SpriteLayout(catalog, catalog.derived["prices"]))
+catalog_store.load()
+query_cache = QueryCache()
+player_store = open_player_store()
+click_buffer = ClickBuffer(player_store)
+image_cache = ImageCache()
+image_prefetcher = ImagePrefetcher(image_cache)
+sprite_sheets = SpriteSheets(image_cache)
+
+def prefetch_new_images(old, new):
+    # The very first fetch is left to `flask prefetch-images`; after that only new ids are rendered
+    if len(old):
+        image_prefetcher.submit(new.cards, [pos for pos in range(len(new)) if new.cards.key(pos) not in old.positions])
+
+def build_sprite_sheets(old, new):
+    # Rebuilt per catalog version on a background thread, never inside a request. The very first
+    # fetch may run in the preloading gunicorn master, so that version is left to the first
+    # worker that is asked for a sheet
+    if len(old):
+        sprite_sheets.submit(new)
+
+catalog_store.on_refresh(prefetch_new_images)
+catalog_store.on_refresh(build_sprite_sheets)
+# gunicorn workers also flush from the worker_exit hook in gunicorn.conf.py
+atexit.register(click_buffer.flush)
 
 # ------------------------
 # Main page template - WITH ZOOM
@@ -74,6 +84,10 @@ MAIN_TEMPLATE = """
             width: 75vw;
         }
         input[type=text], select { padding: 8px; border-radius:5px; border:none; margin-right:5px; }
+        .suggest-box { position:relative; display:inline-block; }
+        .suggestions { position:absolute; left:0; right:5px; top:100%; z-index:10; margin:2px 0 0; padding:0; list-style:none; background:#222; border-radius:5px; text-align:left; }
+        .suggestions li { padding:6px 8px; cursor:pointer; }
+        .suggestions li:hover { background:#4CAF50; }
         button { padding:8px 12px; border-radius:5px; border:none; background-color:#4CAF50; color:white; cursor:pointer; }
         button:hover { background-color:#45a049; }
         .cards-container { display:flex; flex-wrap:wrap; justify-content:center; gap:20px; margin-top:20px; }
@@ -94,14 +108,19 @@ MAIN_TEMPLATE = """
         <a href="/third" class="button">Deck Builder</a>
     </div>
     <form id="searchForm">
-        <input type="text" id="searchInput" placeholder="Search card name...">
+        <span class="suggest-box">
+            <input type="text" id="searchInput" placeholder="Search card name..." autocomplete="off">
+            <ul class="suggestions" id="searchSuggestions"></ul>
+        </span>
         <select id="typeFilter">
             <option value="">All Types</option>
             <option value="Normal">Normal</option>
-            <option value="XYZ">XYZ</option>
-            <option value="Synchro">Synchro</option>
-            <option value="Fusion">Fusion</option>
+            <option value="Effect">Effect</option>
             <option value="Ritual">Ritual</option>
+            <option value="Fusion">Fusion</option>
+            <option value="Synchro">Synchro</option>
+            <option value="XYZ">XYZ</option>
+            <option value="Link">Link</option>
             <option value="Spell">Spell</option>
             <option value="Trap">Trap</option>
         </select>
@@ -119,9 +138,10 @@ MAIN_TEMPLATE = """
     <div class="cards-container" id="cardsContainer"></div>
     <p id="loadingText" style="display:none;">Loading more cards...</p>
     <script>
-        let page = 0;
-        const perPage = 200;
+        let nextCursor = null;
+        let exhausted = false;
         let loading = false;
+        let cardsRequest = 0;
         let searchTerm = '';
         let typeTerm = '';
         let atkTerm = '';
@@ -129,19 +149,31 @@ MAIN_TEMPLATE = """
         const loadingText = document.getElementById('loadingText');
         
         function loadCards() {
-            if(loading) return;
+            if(loading || exhausted) return;
             loading = true;
             loadingText.style.display = 'block';
-            fetch(`/load_cards?page=${page}&search=${searchTerm}&type=${typeTerm}&atk=${atkTerm}`)
+            // A new search bumps cardsRequest, so a page still in flight for the old one is dropped
+            const request = ++cardsRequest;
+            const url = nextCursor
+                ? `/load_cards?cursor=${nextCursor}`
+                : `/load_cards?search=${encodeURIComponent(searchTerm)}&type=${encodeURIComponent(typeTerm)}&atk=${encodeURIComponent(atkTerm)}`;
+            fetch(url)
                 .then(res => res.json())
                 .then(data=>{
-                    data.forEach(card=>{
+                    if(request !== cardsRequest) return;
+                    if(data.restart) container.innerHTML='';
+                    if(data.facets){
+                        showFacets(document.getElementById('typeFilter'), data.facets.type);
+                        showFacets(document.getElementById('atkFilter'), data.facets.atk);
+                    }
+                    data.cards.forEach(card=>{
                         const div = document.createElement('div');
                         div.className='card';
-                        div.innerHTML=`<img src="${card.img}" alt="${card.name}" loading="lazy"><h3>${card.name}</h3><div class="stats"><span>ATK:${card.atk}</span><span>DEF:${card.defense}</span></div>`;
+                        div.innerHTML=`<img src="/img/${card.id}/grid" alt="${card.name}" loading="lazy"><h3>${card.name}</h3><div class="stats"><span>ATK:${card.atk}</span><span>DEF:${card.defense ?? 'N/A'}</span></div>`;
                         container.appendChild(div);
                     });
-                    if(data.length>0) page++;
+                    nextCursor = data.next;
+                    exhausted = !data.next;
                     loading=false;
                     loadingText.style.display='none';
                 });
@@ -151,12 +183,64 @@ MAIN_TEMPLATE = """
             if(window.innerHeight + window.scrollY >= document.body.offsetHeight - 500) loadCards(); 
         });
         
+        // Result counts next to each dropdown option, e.g. "Spell (2,104)"; "All" is the sum
+        function showFacets(select, counts){
+            const total = Object.values(counts).reduce((sum, count) => sum + count, 0);
+            Array.from(select.options).forEach(option=>{
+                if(!option.dataset.label) option.dataset.label = option.textContent;
+                const count = option.value ? counts[option.value] || 0 : total;
+                option.textContent = `${option.dataset.label} (${count.toLocaleString()})`;
+            });
+        }
+        
+        // Name suggestions while typing; debounced so a burst of keystrokes costs one request
+        const SUGGEST_DELAY = 150;
+        
+        function attachSuggestions(input, list, form){
+            let timer = null;
+            let request = 0;
+            const clear = () => { request++; clearTimeout(timer); list.innerHTML=''; };
+            input.addEventListener('input', ()=>{
+                clearTimeout(timer);
+                timer = setTimeout(()=>{
+                    const query = input.value.trim();
+                    const current = ++request;
+                    if(!query){ list.innerHTML=''; return; }
+                    fetch(`/suggest?q=${encodeURIComponent(query)}`)
+                        .then(res => res.json())
+                        .then(data => {
+                            if(current !== request) return;
+                            list.innerHTML='';
+                            data.suggestions.forEach(suggestion=>{
+                                const item = document.createElement('li');
+                                item.textContent = suggestion.name;
+                                // mousedown, so it runs before the input's blur clears the list
+                                item.addEventListener('mousedown', e=>{
+                                    e.preventDefault();
+                                    input.value = suggestion.name;
+                                    clear();
+                                    form.requestSubmit();
+                                });
+                                list.appendChild(item);
+                            });
+                        });
+                }, SUGGEST_DELAY);
+            });
+            input.addEventListener('blur', clear);
+            form.addEventListener('submit', clear);
+        }
+        
+        attachSuggestions(document.getElementById('searchInput'), document.getElementById('searchSuggestions'), document.getElementById('searchForm'));
+        
         document.getElementById('searchForm').addEventListener('submit', e=>{
             e.preventDefault();
             searchTerm = document.getElementById('searchInput').value.toLowerCase();
             typeTerm = document.getElementById('typeFilter').value;
             atkTerm = document.getElementById('atkFilter').value;
-            page=0;
+            cardsRequest++;
+            nextCursor=null;
+            exhausted=false;
+            loading=false;
             container.innerHTML='';
             window.scrollTo({top:0,behavior:'smooth'});
             loadCards();
@@ -211,6 +295,10 @@ CLICKER_TEMPLATE = """
         #clickButton:active { opacity:0.8; }
         form { margin-bottom: 20px; }
         input[type=text], select { padding: 6px; border-radius:5px; border:none; margin-right:5px; }
+        .suggest-box{position:relative;display:inline-block;}
+        .suggestions{position:absolute;left:0;right:5px;top:100%;z-index:10;margin:2px 0 0;padding:0;list-style:none;background:#222;border-radius:5px;text-align:left;}
+        .suggestions li{padding:5px 6px;cursor:pointer;}
+        .suggestions li:hover{background:#4CAF50;}
         button { padding:6px 10px; border-radius:5px; border:none; background-color:#4CAF50; color:white; cursor:pointer; }
         button:hover { background-color:#45a049; }
         .godly-tier { border: 3px solid gold; box-shadow: 0 0 15px gold; }
@@ -229,14 +317,19 @@ CLICKER_TEMPLATE = """
         <img id="clickButton" src="https://ms.yugipedia.com//thumb/e/e5/Back-EN.png/257px-Back-EN.png" alt="Click Me!">
     </div>
     <form id="shopSearchForm">
-        <input type="text" id="shopSearchInput" placeholder="Search card name...">
+        <span class="suggest-box">
+            <input type="text" id="shopSearchInput" placeholder="Search card name..." autocomplete="off">
+            <ul class="suggestions" id="shopSearchSuggestions"></ul>
+        </span>
         <select id="shopTypeFilter">
             <option value="">All Types</option>
             <option value="Normal">Normal</option>
-            <option value="XYZ">XYZ</option>
-            <option value="Synchro">Synchro</option>
-            <option value="Fusion">Fusion</option>
+            <option value="Effect">Effect</option>
             <option value="Ritual">Ritual</option>
+            <option value="Fusion">Fusion</option>
+            <option value="Synchro">Synchro</option>
+            <option value="XYZ">XYZ</option>
+            <option value="Link">Link</option>
             <option value="Spell">Spell</option>
             <option value="Trap">Trap</option>
         </select>
@@ -261,85 +354,131 @@ CLICKER_TEMPLATE = """
         let coins=0;
         let clickValue=1;
         let purchasedCards=[];
-        let shopPage=0;
+        let pendingClicks=0;
+        let clickSeq=0;
+        let flushing=null;
+        let shopCursor=null;
+        let shopExhausted=false;
+        let shopRequest=0;
         let viewingPurchased=false;
-        const perPage=50;
+        const shopCards=new Map();
         const shopContainer=document.getElementById('shop');
         const collectionContainer=document.getElementById('collection');
         const coinsDisplay=document.getElementById('coins');
         const clickValueDisplay=document.getElementById('clickValue');
         const clickButton=document.getElementById('clickButton');
         const loadingShop=document.getElementById('loadingShop');
-        const allCards={{ all_cards|tojson }};
-        const godlyTierCards = ["Obelisk the Tormentor", "The Winged Dragon of Ra", "Slifer the Sky Dragon", "Pot of Greed"];
         let shopLoading=false;
-        let shopFilteredCards = allCards.slice();
         let searchTerm='';
         let typeTerm='';
         let atkTerm='';
         
-        function getCardPrice(card){
-            // Godly tier cards cost 3,500,000 coins
-            if(godlyTierCards.includes(card.name)) return 3500000;
-            
-            const atk=card.atk||0;
-            if(atk<=999) return 500;
-            if(atk<=1999) return 2000;
-            if(atk<=2999) return 10000;
-            if(atk<=3999) return 25000;
-            if(atk<=4999) return 50000;
-            return 100000;
-        }
-        
-        function getCardBoost(card){
-            // Godly tier cards give massive boost
-            if(godlyTierCards.includes(card.name)) return 10000;
-            
-            const price = getCardPrice(card);
-            const atk = card.atk || 0;
-            if(price >= 100000) return 25;
-            if(atk <= 999) return 8;
-            if(atk <= 1999) return 16;
-            if(atk <= 2999) return 50;
-            if(atk <= 3999) return 120;
-            if(atk <= 4999) return 250;
-            return 500;
+        // Prices and boosts are computed server-side and shipped with the catalog
+        function getCardPrice(card){ return card.price; }
+        
+        function getCardBoost(card){ return card.boost; }
+        
+        function postJSON(url, body, method){
+            return fetch(url, {method: method || 'POST', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(body)})
+                .then(res => res.json().then(data => res.ok ? data : Promise.reject(data)));
         }
         
-        function saveState(){
-            localStorage.setItem('coins', coins);
-            localStorage.setItem('purchasedCards', JSON.stringify(purchasedCards.map(c=>c.name)));
+        function fetchCards(ids){
+            return ids.length ? postJSON('/cards', {ids: ids}).then(data => data.cards) : Promise.resolve([]);
         }
         
-        function loadState(){
-            const savedCoins = localStorage.getItem('coins');
+        function importLocalProfile(profile){
+            // One-time move of a save that only exists in this browser's localStorage
+            const savedCoins = parseInt(localStorage.getItem('coins') || '0');
             const savedCards = JSON.parse(localStorage.getItem('purchasedCards') || '[]');
-            if(savedCoins) coins = parseInt(savedCoins);
-            purchasedCards = allCards.filter(c => savedCards.includes(c.name));
-            updateClickValue();
-            updateCollection();
-            updateDisplay();
+            const fresh = profile.seq === 0 && profile.coins === 0 && profile.owned.length === 0;
+            if(!fresh || (!savedCoins && savedCards.length === 0)) return Promise.resolve(profile);
+            return postJSON('/api/player/import', {coins: savedCoins, cards: savedCards})
+                .then(() => {
+                    localStorage.removeItem('coins');
+                    localStorage.removeItem('purchasedCards');
+                    return fetch('/api/player').then(res => res.json());
+                })
+                .catch(() => profile);
+        }
+        
+        function loadState(){
+            fetch('/api/player')
+                .then(res => res.json())
+                .then(importLocalProfile)
+                .then(profile => fetchCards(profile.owned).then(cards => {
+                    coins = profile.coins + pendingClicks*profile.click_value;
+                    clickSeq = profile.seq;
+                    purchasedCards = cards;
+                    updateClickValue(profile.click_value);
+                    updateCollection();
+                    updateDisplay();
+                }));
         }
         
+        // Clicks are counted locally and sent in batches; the server's coin total wins on every reply
+        function flushClicks(){
+            if(flushing) return flushing;
+            if(pendingClicks===0) return Promise.resolve();
+            const batch = {clicks: pendingClicks, seq: clickSeq+1};
+            pendingClicks = 0;
+            flushing = postJSON('/api/player/clicks', batch)
+                .then(data => {
+                    clickSeq = data.seq;
+                    coins = data.coins + pendingClicks*clickValue;
+                    updateDisplay();
+                })
+                .catch(() => { pendingClicks += batch.clicks; })
+                .finally(() => { flushing = null; });
+            return flushing;
+        }
+        
+        setInterval(flushClicks, 3000);
+        document.addEventListener('visibilitychange', ()=>{
+            if(document.visibilityState !== 'hidden' || pendingClicks===0 || flushing) return;
+            const batch = {clicks: pendingClicks, seq: ++clickSeq};
+            pendingClicks = 0;
+            navigator.sendBeacon('/api/player/clicks', new Blob([JSON.stringify(batch)], {type: 'application/json'}));
+        });
+        
         function loadShop(){
-            if(shopLoading || viewingPurchased) return;
+            if(shopLoading || viewingPurchased || shopExhausted) return;
             shopLoading = true;
             loadingShop.style.display='block';
-            const start = shopPage*perPage;
-            const end = start+perPage;
-            const chunk = shopFilteredCards.slice(start,end);
-            chunk.forEach(card=>{
-                const price=getCardPrice(card);
-                const boost=getCardBoost(card);
-                const cardDiv=document.createElement('div');
-                const isGodly = godlyTierCards.includes(card.name);
-                cardDiv.className = isGodly ? 'card godly-tier' : 'card';
-                cardDiv.innerHTML=`<img src="${card.img}" alt="${card.name}" loading="lazy"><h4>${card.name}</h4><p>ATK: ${card.atk} | Boost: ${boost}X</p><p>Price: ${price.toLocaleString()} Yugi Coins</p><button onclick="buyCard(${allCards.indexOf(card)})">Buy</button>`;
-                shopContainer.appendChild(cardDiv);
-            });
-            if(chunk.length>0) shopPage++;
+            // A new search bumps shopRequest, so a page still in flight for the old one is dropped
+            const request = ++shopRequest;
+            const url = shopCursor
+                ? `/shop/cards?cursor=${shopCursor}`
+                : `/shop/cards?search=${encodeURIComponent(searchTerm)}&type=${encodeURIComponent(typeTerm)}&atk=${encodeURIComponent(atkTerm)}`;
+            fetch(url)
+                .then(res => res.json())
+                .then(data => {
+                    if(request !== shopRequest) return;
+                    if(data.restart) shopContainer.innerHTML='';
+                    if(data.facets){
+                        showFacets(document.getElementById('shopTypeFilter'), data.facets.type);
+                        showFacets(document.getElementById('shopAtkFilter'), data.facets.atk);
+                    }
+                    data.cards.forEach(card=>{
+                        shopCards.set(card.id, card);
+                        const cardDiv=document.createElement('div');
+                        cardDiv.className = card.godly ? 'card godly-tier' : 'card';
+                        cardDiv.innerHTML=`<img src="/img/${card.id}/shop" alt="${card.name}" loading="lazy"><h4>${card.name}</h4><p>ATK: ${card.atk} | Boost: ${card.boost}X</p><p>Price: ${card.price.toLocaleString()} Yugi Coins</p><button onclick="buyCard(${card.id})">Buy</button>`;
+                        shopContainer.appendChild(cardDiv);
+                    });
+                    shopCursor = data.next;
+                    shopExhausted = !data.next;
+                    shopLoading=false;
+                    loadingShop.style.display='none';
+                });
+        }
+        
+        function resetShop(){
+            shopRequest++;
+            shopCursor=null;
+            shopExhausted=false;
             shopLoading=false;
-            loadingShop.style.display='none';
+            shopContainer.innerHTML='';
         }
         
         window.addEventListener('scroll', ()=>{
@@ -347,36 +486,38 @@ CLICKER_TEMPLATE = """
             if(window.innerHeight + window.scrollY >= document.body.offsetHeight - 500) loadShop();
         });
         
-        function buyCard(index){
-            const card = allCards[index];
-            const price = getCardPrice(card);
-            const boost = getCardBoost(card);
-            if(coins >= price && !purchasedCards.includes(card)){
-                coins -= price;
-                purchasedCards.push(card);
-                updateClickValue();
-                updateCollection();
-                updateDisplay();
-                saveState();
-            } else {
+        function buyCard(id){
+            const card = shopCards.get(id);
+            if(coins < getCardPrice(card) || purchasedCards.some(c => c.id === card.id)){
                 alert('Not enough coins or already purchased!');
+                return;
             }
+            // Flush first so the server has seen every click before it checks the balance
+            flushClicks()
+                .then(() => postJSON('/api/player/buy', {card_id: id}))
+                .then(data => {
+                    purchasedCards.push(card);
+                    updateClickValue(data.click_value);
+                    coins = data.coins + pendingClicks*clickValue;
+                    updateCollection();
+                    updateDisplay();
+                })
+                .catch(err => alert((err && err.error) || 'Not enough coins or already purchased!'));
         }
         
         function updateCollection(){
             collectionContainer.innerHTML='';
             purchasedCards.forEach(card=>{
                 const cardDiv=document.createElement('div');
-                const isGodly = godlyTierCards.includes(card.name);
+                const isGodly = card.godly;
                 cardDiv.className = isGodly ? 'card godly-tier' : 'card';
-                cardDiv.innerHTML=`<img src="${card.img}" alt="${card.name}" loading="lazy"><h4>${card.name}</h4><p>Boost: ${getCardBoost(card)}X</p>`;
+                cardDiv.innerHTML=`<img src="/img/${card.id}/shop" alt="${card.name}" loading="lazy"><h4>${card.name}</h4><p>Boost: ${getCardBoost(card)}X</p>`;
                 collectionContainer.appendChild(cardDiv);
             });
         }
         
-        function updateClickValue(){
-            clickValue = purchasedCards.reduce((acc, c) => acc + getCardBoost(c), 0);
-            if(clickValue===0) clickValue=1;
+        function updateClickValue(value){
+            clickValue = value;
             clickValueDisplay.textContent = clickValue;
         }
         
@@ -385,59 +526,91 @@ CLICKER_TEMPLATE = """
         function addCoins(e){
             e.preventDefault();
             coins += clickValue;
+            pendingClicks++;
             updateDisplay();
-            saveState();
         }
         
         clickButton.addEventListener('click', addCoins);
         clickButton.addEventListener('touchstart', addCoins);
         
+        // Result counts next to each dropdown option, e.g. "Spell (2,104)"; "All" is the sum
+        function showFacets(select, counts){
+            const total = Object.values(counts).reduce((sum, count) => sum + count, 0);
+            Array.from(select.options).forEach(option=>{
+                if(!option.dataset.label) option.dataset.label = option.textContent;
+                const count = option.value ? counts[option.value] || 0 : total;
+                option.textContent = `${option.dataset.label} (${count.toLocaleString()})`;
+            });
+        }
+        
+        // Name suggestions while typing; debounced so a burst of keystrokes costs one request
+        const SUGGEST_DELAY = 150;
+        
+        function attachSuggestions(input, list, form){
+            let timer = null;
+            let request = 0;
+            const clear = () => { request++; clearTimeout(timer); list.innerHTML=''; };
+            input.addEventListener('input', ()=>{
+                clearTimeout(timer);
+                timer = setTimeout(()=>{
+                    const query = input.value.trim();
+                    const current = ++request;
+                    if(!query){ list.innerHTML=''; return; }
+                    fetch(`/suggest?q=${encodeURIComponent(query)}`)
+                        .then(res => res.json())
+                        .then(data => {
+                            if(current !== request) return;
+                            list.innerHTML='';
+                            data.suggestions.forEach(suggestion=>{
+                                const item = document.createElement('li');
+                                item.textContent = suggestion.name;
+                                // mousedown, so it runs before the input's blur clears the list
+                                item.addEventListener('mousedown', e=>{
+                                    e.preventDefault();
+                                    input.value = suggestion.name;
+                                    clear();
+                                    form.requestSubmit();
+                                });
+                                list.appendChild(item);
+                            });
+                        });
+                }, SUGGEST_DELAY);
+            });
+            input.addEventListener('blur', clear);
+            form.addEventListener('submit', clear);
+        }
+        
+        attachSuggestions(document.getElementById('shopSearchInput'), document.getElementById('shopSearchSuggestions'), document.getElementById('shopSearchForm'));
+        
         document.getElementById('shopSearchForm').addEventListener('submit', e=>{
             e.preventDefault();
             viewingPurchased=false;
             searchTerm = document.getElementById('shopSearchInput').value.toLowerCase();
             typeTerm = document.getElementById('shopTypeFilter').value;
             atkTerm = document.getElementById('shopAtkFilter').value;
-            shopFilteredCards = allCards.filter(c=>{
-                let match=true;
-                if(searchTerm) match = match && c.name.toLowerCase().includes(searchTerm);
-                if(typeTerm) match = match && c.type===typeTerm;
-                if(atkTerm){
-                    const atk=c.atk||0;
-                    if(atkTerm==='0-999') match = match && atk<=999;
-                    else if(atkTerm==='1000-1999') match = match && atk>=1000 && atk<=1999;
-                    else if(atkTerm==='2000-2999') match = match && atk>=2000 && atk<=2999;
-                    else if(atkTerm==='3000-3999') match = match && atk>=3000 && atk<=3999;
-                    else if(atkTerm==='4000-4999') match = match && atk>=4000 && atk<=4999;
-                    else if(atkTerm==='5000+') match = match && atk>=5000;
-                }
-                return match;
-            });
-            shopPage=0;
-            shopContainer.innerHTML='';
+            resetShop();
             loadShop();
         });
         
         document.getElementById('showPurchasedBtn').addEventListener('click', ()=>{
             viewingPurchased=true;
-            shopContainer.innerHTML='';
-            shopPage=0;
+            resetShop();
             if(purchasedCards.length===0){
                 shopContainer.innerHTML='<p>No cards purchased yet!</p>';
                 return;
             }
             purchasedCards.forEach(card=>{
                 const boost = getCardBoost(card);
-                const isGodly = godlyTierCards.includes(card.name);
+                const isGodly = card.godly;
                 const cardDiv=document.createElement('div');
                 cardDiv.className = isGodly ? 'card godly-tier' : 'card';
-                cardDiv.innerHTML=`<img src="${card.img}" alt="${card.name}" loading="lazy"><h4>${card.name}</h4><p>ATK: ${card.atk} | Boost: ${boost}X</p>`;
+                cardDiv.innerHTML=`<img src="/img/${card.id}/shop" alt="${card.name}" loading="lazy"><h4>${card.name}</h4><p>ATK: ${card.atk} | Boost: ${boost}X</p>`;
                 shopContainer.appendChild(cardDiv);
             });
         });
         
-        loadState();
         loadShop();
+        loadState();
         updateDisplay();
     </script>
 </body>
@@ -529,6 +702,7 @@ DECK_BUILDER_TEMPLATE = """
             position: relative;
         }
         .card img { width:100%; border-radius:5px; }
+        .card .sprite { width:100%; border-radius:5px; }
         .collection-container { 
             display:flex; 
             flex-wrap:wrap; 
@@ -595,21 +769,24 @@ DECK_BUILDER_TEMPLATE = """
     </div>
     
     <div class="rules-info">
-        <strong>Deck Rules:</strong> Main Deck: 30 cards max (Normal/Spell/Trap only, max 3 copies each) | Extra Deck: 15 cards max (XYZ/Fusion only) | Godly Cards: 1 copy max
+        <strong>Deck Rules:</strong> Main Deck: 30 cards max (main deck monsters/Spell/Trap, max 3 copies each) | Extra Deck: 15 cards max (Fusion/Synchro/XYZ/Link only) | Godly Cards: 1 copy max
     </div>
     
     <div class="deck-count">
         Main Deck: <span id="mainDeckCount">0</span>/30 | Extra Deck: <span id="extraDeckCount">0</span>/15
         <button class="button clear-deck" onclick="clearDeck()">Clear Deck</button>
+        <button class="button" onclick="shareDeck()">Share Code</button>
+        <button class="button" onclick="importDeck()">Import Code</button>
+        <a class="button" href="/api/player/deck/export?format=ydk">Download .ydk</a>
     </div>
     
     <div class="deck-section">
-        <h2>Main Deck (Normal/Spell/Trap only)</h2>
+        <h2>Main Deck (main deck monsters/Spell/Trap)</h2>
         <div class="deck-container" id="mainDeckContainer"></div>
     </div>
     
     <div class="deck-section">
-        <h2>Extra Deck (XYZ/Fusion only)</h2>
+        <h2>Extra Deck (Fusion/Synchro/XYZ/Link only)</h2>
         <div class="extra-deck-container" id="extraDeckContainer"></div>
     </div>
     
@@ -617,49 +794,141 @@ DECK_BUILDER_TEMPLATE = """
     <div class="collection-container" id="collectionContainer"></div>
     
     <script>
-        const allCards = {{ all_cards|tojson }};
-        const godlyTierCards = ["Obelisk the Tormentor", "The Winged Dragon of Ra", "Slifer the Sky Dragon", "Pot of Greed"];
         let purchasedCards = [];
         let currentMainDeck = Array(30).fill(null);
         let currentExtraDeck = Array(15).fill(null);
         let draggedCard = null;
+        let sprites = null;
+        let spriteSlots = new Map();
+        let spriteSheetsInUse = new Set();
+        // Below this many owned cards on a sheet, single thumbnails download less than the whole sheet
+        const SPRITE_MIN_CARDS = 8;
 
-        function loadDeckState() {
-            const savedDeck = JSON.parse(localStorage.getItem('currentDeck') || '{"main":[],"extra":[]}');
+        function indexSprites(manifest) {
+            sprites = manifest;
+            spriteSlots = new Map();
+            manifest.sheets.forEach((ids, sheet) => ids.forEach((id, slot) => spriteSlots.set(id, [sheet, slot])));
+        }
+
+        function chooseSpriteSheets() {
+            const counts = new Map();
+            purchasedCards.forEach(card => {
+                const found = spriteSlots.get(card.id);
+                if (found) counts.set(found[0], (counts.get(found[0]) || 0) + 1);
+            });
+            spriteSheetsInUse = new Set([...counts].filter(([, n]) => n >= SPRITE_MIN_CARDS).map(([sheet]) => sheet));
+            spriteSheetsInUse.forEach(sheet => {
+                // A sheet that isn't built yet answers with an error: show those cards' own thumbnails
+                const probe = new Image();
+                probe.onerror = () => {
+                    spriteSheetsInUse.delete(sheet);
+                    renderDecks();
+                    renderCollection();
+                };
+                probe.src = `/sprites/${sprites.version}/${sheet}`;
+            });
+        }
+
+        function cardImage(card) {
+            const found = spriteSlots.get(card.id);
+            if (!found || !spriteSheetsInUse.has(found[0])) {
+                return `<img src="/img/${card.id}/deck" alt="${card.name}" loading="lazy">`;
+            }
+            const [sheet, slot] = found;
+            const column = slot % sprites.columns, row = Math.floor(slot / sprites.columns);
+            const style = [
+                `background-image:url(/sprites/${sprites.version}/${sheet})`,
+                `background-size:${sprites.columns * 100}% ${sprites.rows * 100}%`,
+                `background-position:${column * 100 / (sprites.columns - 1)}% ${row * 100 / (sprites.rows - 1)}%`,
+                `aspect-ratio:${sprites.tile[0]}/${sprites.tile[1]}`
+            ].join(';');
+            return `<div class="sprite" role="img" aria-label="${card.name}" style="${style}"></div>`;
+        }
+
+        function postJSON(url, body, method) {
+            return fetch(url, { method: method || 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(body) })
+                .then(res => res.json().then(data => res.ok ? data : Promise.reject(data)));
+        }
+
+        function fetchCards(ids) {
+            return ids.length ? postJSON('/cards', { ids: ids }).then(data => data.cards) : Promise.resolve([]);
+        }
+
+        function importLocalProfile(profile) {
+            // One-time move of a save that only exists in this browser's localStorage
+            const savedCoins = parseInt(localStorage.getItem('coins') || '0');
             const savedCards = JSON.parse(localStorage.getItem('purchasedCards') || '[]');
-            purchasedCards = allCards.filter(c => savedCards.includes(c.name));
-            
-            // Load main deck
-            currentMainDeck = Array(30).fill(null);
-            if (savedDeck.main) {
-                savedDeck.main.forEach((cardName, index) => {
-                    if (index < 30 && cardName) {
-                        currentMainDeck[index] = purchasedCards.find(c => c.name === cardName) || null;
+            const fresh = profile.seq === 0 && profile.coins === 0 && profile.owned.length === 0;
+            if (!fresh || (!savedCoins && savedCards.length === 0)) return Promise.resolve(profile);
+            return postJSON('/api/player/import', { coins: savedCoins, cards: savedCards })
+                .then(() => {
+                    localStorage.removeItem('coins');
+                    localStorage.removeItem('purchasedCards');
+                    return fetch('/api/player').then(res => res.json());
+                })
+                .catch(() => profile);
+        }
+
+        function loadDeckState() {
+            fetch('/api/player')
+                .then(res => res.json())
+                .then(importLocalProfile)
+                .then(profile => fetchCards(profile.owned).then(cards => [profile, cards]))
+                .then(([profile, cards]) => {
+                    purchasedCards = cards;
+                    chooseSpriteSheets();
+                    const byId = new Map(purchasedCards.map(c => [c.id, c]));
+                    let savedDeck = profile.deck;
+
+                    // Decks saved before they lived on the server are stored by name in localStorage
+                    const localDeck = localStorage.getItem('currentDeck');
+                    const migrating = localDeck && savedDeck.main.length === 0 && savedDeck.extra.length === 0;
+                    if (migrating) {
+                        const byName = new Map(purchasedCards.map(c => [c.name, c.id]));
+                        const names = JSON.parse(localDeck);
+                        savedDeck = {
+                            main: (names.main || []).map(name => byName.get(name) || null),
+                            extra: (names.extra || []).map(name => byName.get(name) || null)
+                        };
                     }
-                });
-            }
-            
-            // Load extra deck
-            currentExtraDeck = Array(15).fill(null);
-            if (savedDeck.extra) {
-                savedDeck.extra.forEach((cardName, index) => {
-                    if (index < 15 && cardName) {
-                        currentExtraDeck[index] = purchasedCards.find(c => c.name === cardName) || null;
+
+                    // Load main deck
+                    currentMainDeck = Array(30).fill(null);
+                    savedDeck.main.forEach((cardId, index) => {
+                        if (index < 30 && cardId) {
+                            currentMainDeck[index] = byId.get(cardId) || null;
+                        }
+                    });
+
+                    // Load extra deck
+                    currentExtraDeck = Array(15).fill(null);
+                    savedDeck.extra.forEach((cardId, index) => {
+                        if (index < 15 && cardId) {
+                            currentExtraDeck[index] = byId.get(cardId) || null;
+                        }
+                    });
+
+                    if (migrating) {
+                        saveDeckState();
+                        localStorage.removeItem('currentDeck');
                     }
+                    renderDecks();
+                    renderCollection();
+                    updateDeckCounts();
                 });
-            }
-            
-            renderDecks();
-            renderCollection();
-            updateDeckCounts();
         }
 
         function saveDeckState() {
             const deckData = {
-                main: currentMainDeck.map(c => c ? c.name : null),
-                extra: currentExtraDeck.map(c => c ? c.name : null)
+                main: currentMainDeck.map(c => c ? c.id : null),
+                extra: currentExtraDeck.map(c => c ? c.id : null)
             };
-            localStorage.setItem('currentDeck', JSON.stringify(deckData));
+            postJSON('/api/player/deck', deckData, 'PUT')
+                .catch(err => {
+                    // The server's rules win: say why, then show the deck it actually has
+                    alert('Deck not saved: ' + ((err && err.errors) || [(err && err.error) || 'the server could not be reached']).join('\\n'));
+                    loadDeckState();
+                });
         }
 
         function renderDecks() {
@@ -719,7 +988,7 @@ DECK_BUILDER_TEMPLATE = """
             cardDiv.setAttribute('data-deck-type', deckType);
             cardDiv.setAttribute('data-slot-index', index);
             cardDiv.innerHTML = `
-                <img src="${card.img}" alt="${card.name}" loading="lazy">
+                ${cardImage(card)}
                 <div class="card-name">${card.name}</div>
             `;
             
@@ -729,7 +998,7 @@ DECK_BUILDER_TEMPLATE = """
         }
 
         function getCardClass(card) {
-            if (godlyTierCards.includes(card.name)) return 'godly-tier';
+            if (card.godly) return 'godly-tier';
             if (card.type === 'XYZ') return 'xyz-tier';
             if (card.type === 'Fusion') return 'fusion-tier';
             return '';
@@ -758,7 +1027,7 @@ DECK_BUILDER_TEMPLATE = """
                 cardDiv.setAttribute('data-card-name', card.name);
                 cardDiv.setAttribute('data-card-type', card.type);
                 cardDiv.innerHTML = `
-                    <img src="${card.img}" alt="${card.name}" loading="lazy">
+                    ${cardImage(card)}
                     <div class="card-name">${card.name}</div>
                 `;
                 
@@ -830,7 +1099,7 @@ DECK_BUILDER_TEMPLATE = """
                 
                 if (dragData.type === 'collection') {
                     // Validate card placement
-                    if (!validateCardPlacement(dragData, slotType)) {
+                    if (!validateCardPlacement(dragData, slotType, slotIndex)) {
                         slot.classList.add('invalid');
                         setTimeout(() => slot.classList.remove('invalid'), 1000);
                         return;
@@ -875,39 +1144,36 @@ DECK_BUILDER_TEMPLATE = """
             }
         }
 
-        function validateCardPlacement(dragData, slotType) {
+        function validateCardPlacement(dragData, slotType, slotIndex) {
             const card = purchasedCards.find(c => c.name === dragData.name);
             if (!card) return false;
             
             return validateCardTypeForDeck(card, slotType) && 
-                   validateCardLimits(card, slotType);
+                   validateCardLimits(card, slotType, slotIndex);
         }
 
         function validateCardTypeForDeck(card, slotType) {
-            // Main deck can only have Normal, Spell, Trap
+            // extra_deck is set by the server for Fusion, Synchro, XYZ and Link monsters
             if (slotType === 'main') {
-                return ['Normal', 'Spell', 'Trap', 'Ritual', 'Synchro'].includes(card.type);
+                return !card.extra_deck && card.type !== 'Unknown';
             }
-            // Extra deck can only have XYZ, Fusion
             if (slotType === 'extra') {
-                return ['XYZ', 'Fusion'].includes(card.type);
+                return card.extra_deck;
             }
             return false;
         }
 
-        function validateCardLimits(card, slotType) {
-            if (slotType === 'main') {
-                // Check godly card limit
-                if (godlyTierCards.includes(card.name)) {
-                    const godlyCount = currentMainDeck.filter(c => c && godlyTierCards.includes(c.name)).length;
-                    if (godlyCount >= 1) return false;
-                }
-                
-                // Check general card limit (max 3 copies)
-                const cardCount = currentMainDeck.filter(c => c && c.name === card.name).length;
-                if (cardCount >= 3) return false;
-            }
-            return true;
+        function validateCardLimits(card, slotType, slotIndex) {
+            // Same rules as the server (decks.Deck.check): limits count main and extra deck
+            // together, and the card being replaced in the target slot doesn't count
+            const others = currentMainDeck.filter((c, i) => c && !(slotType === 'main' && i === slotIndex))
+                .concat(currentExtraDeck.filter((c, i) => c && !(slotType === 'extra' && i === slotIndex)));
+            
+            // Check godly card limit (1 per deck)
+            if (card.godly && others.filter(c => c.godly).length >= 1) return false;
+            
+            // Check general card limit (max 3 copies)
+            return others.filter(c => c.name === card.name).length < 3;
         }
 
         function handleDragEnd(e) {
@@ -930,6 +1196,20 @@ DECK_BUILDER_TEMPLATE = """
             }
         }
 
+        function shareDeck() {
+            fetch('/api/player/deck/export')
+                .then(res => res.json())
+                .then(data => prompt('Deck code (copy to share):', data.code));
+        }
+
+        function importDeck() {
+            const code = prompt('Paste a deck code:');
+            if (!code) return;
+            postJSON('/api/player/deck/import', { code: code.trim() })
+                .then(() => loadDeckState())
+                .catch(err => alert(err.error || 'Import failed'));
+        }
+
         function updateDeckCounts() {
             const mainCount = currentMainDeck.filter(card => card !== null).length;
             const extraCount = currentExtraDeck.filter(card => card !== null).length;
@@ -966,51 +1246,499 @@ DECK_BUILDER_TEMPLATE = """
         });
 
         // Initialize
-        loadDeckState();
+        // Without the manifest every tile simply falls back to its own thumbnail
+        fetch('{{ sprites_url }}')
+            .then(res => res.json())
+            .then(indexSprites)
+            .catch(() => {})
+            .then(loadDeckState);
     </script>
 </body>
 </html>
 """
 
+# ------------------------
+# Pre-rendered pages (compiled once, rendered once per catalog version)
+# ------------------------
+PAGE_TEMPLATES = {
+    "main": app.jinja_env.from_string(MAIN_TEMPLATE),
+    "second": app.jinja_env.from_string(CLICKER_TEMPLATE),
+    "third": app.jinja_env.from_string(DECK_BUILDER_TEMPLATE),
+}
+
+def render_pages(catalog):
+    pages = {}
+    with app.app_context():
+        for name, template in PAGE_TEMPLATES.items():
+            body = template.render(sprites_url=f"/sprites.{catalog.version}.json").encode()
+            pages[name] = Payload(body, "text/html")
+    return pages
+
+catalog_store.derive("pages", render_pages)
+
+def cached_response(payload, immutable=False):
+    encoding, body, etag = payload.select(request.accept_encodings)
+    response = app.response_class(body, mimetype=payload.mimetype)
+    response.set_etag(etag)
+    response.vary.add("Accept-Encoding")
+    if encoding != "identity":
+        response.content_encoding = encoding
+    if immutable:
+        # Only used for versioned URLs, so browsers and CDNs may keep them forever
+        response.cache_control.public = True
+        response.cache_control.max_age = 365*24*60*60
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def page_response(name):
+    return cached_response(catalog_store.current.derived["pages"][name])
+
+# Card lookups change only with the catalog; short-lived so a refresh shows up soon
+CARD_MAX_AGE = 300
+MAX_CARD_LOOKUP = 20000
+SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+# Longer input is cut, which also bounds the typo search
+MAX_SUGGEST_QUERY = 64
+
+def short_cache(response):
+    response.cache_control.public = True
+    response.cache_control.max_age = CARD_MAX_AGE
+    # Weak: compress_json may still change the bytes per Accept-Encoding
+    response.add_etag(weak=True)
+    return response.make_conditional(request)
+
 # ------------------------
 # Routes
 # ------------------------
+@app.before_request
+def start_catalog_refresh():
+    catalog_store.ensure_refreshing()
+
+@app.after_request
+def compress_json(response):
+    # Pre-built payloads already carry their encoding; this covers dynamic JSON like /load_cards
+    if (response.status_code != 200 or response.direct_passthrough or response.content_encoding
+            or response.mimetype != "application/json"):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_SIZE:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(request.accept_encodings, ENCODINGS)
+    if encoding != "identity":
+        response.set_data(compress(body, encoding, fast=True))
+        response.content_encoding = encoding
+    return response
+
 @app.route("/")
 def main_page():
-    return render_template_string(MAIN_TEMPLATE)
+    return page_response("main")
 
 @app.route("/second")
 def second_page():
-    return render_template_string(CLICKER_TEMPLATE, all_cards=all_cards)
+    return page_response("second")
 
 @app.route("/third")
 def third_page():
-    return render_template_string(DECK_BUILDER_TEMPLATE, all_cards=all_cards)
+    return page_response("third")
+
+def search_page(per_page, card_at):
+    """One page of a search/type/ATK query plus the cursor for the next one."""
+    cursor=request.args.get("cursor")
+    if cursor:
+        try:
+            search, type_filter, atk_filter, start, version = decode_cursor(cursor)
+            if not all(isinstance(field, str) for field in (search, type_filter, atk_filter, version)):
+                raise ValueError("invalid cursor")
+            start = max(int(start), 0)
+        except (ValueError, TypeError):
+            return jsonify({"error": "invalid cursor"}), 400
+    else:
+        search=request.args.get("search","").strip().lower()
+        type_filter=request.args.get("type","").strip()
+        atk_filter=request.args.get("atk","").strip()
+        start=max(request.args.get("page", 0, type=int), 0)*per_page
+    catalog=catalog_store.current
+    # An offset into another catalog version would skip or repeat cards, so start over
+    restart=bool(cursor) and version != catalog.version
+    if restart:
+        start=0
+    key=(search, type_filter, atk_filter, catalog.version)
+    result=query_cache.get_or_compute(key, lambda: catalog.derived["search"].query_with_facets(search, type_filter, atk_filter))
+    end=start+per_page
+    page={
+        "cards": [card_at(catalog, pos) for pos in result.positions[start:end]],
+        "next": encode_cursor(search, type_filter, atk_filter, end, catalog.version) if end < len(result) else None,
+    }
+    if not cursor or restart:
+        # Per-option result counts for the type and ATK dropdowns, with the first page only
+        page["facets"]=result.facets
+    if restart:
+        # Tells the page to drop the cards it has and show these instead
+        page["restart"]=True
+    return jsonify(page)
 
 @app.route("/load_cards")
 def load_cards():
-    page=int(request.args.get("page",0))
-    per_page=200
-    search=request.args.get("search","").strip().lower()
-    type_filter=request.args.get("type","").strip()
-    atk_filter=request.args.get("atk","").strip()
-    filtered=all_cards
-    if search: filtered=[c for c in filtered if search in c['name'].lower()]
-    if type_filter: filtered=[c for c in filtered if c['type']==type_filter]
-    if atk_filter:
-        def atk_check(a):
-            atk = a['atk'] or 0
-            if atk_filter=='0-999': return atk<=999
-            if atk_filter=='1000-1999': return atk>=1000 and atk<=1999
-            if atk_filter=='2000-2999': return atk>=2000 and atk<=2999
-            if atk_filter=='3000-3999': return atk>=3000 and atk<=3999
-            if atk_filter=='4000-4999': return atk>=4000 and atk<=4999
-            if atk_filter=='5000+': return atk>=5000
-            return True
-        filtered=[c for c in filtered if atk_check(c)]
-    start=page*per_page
+    return search_page(200, lambda catalog, pos: catalog.cards[pos])
+
+@app.route("/shop/cards")
+def shop_cards():
+    return search_page(50, lambda catalog, pos: catalog.derived["prices"].annotate(pos, catalog.cards[pos]))
+
+@app.route("/sprites.<version>.json")
+def sprite_manifest(version):
+    catalog=catalog_store.current
+    if version != catalog.version:
+        return redirect(url_for("sprite_manifest", version=catalog.version))
+    return cached_response(catalog.derived["sprites"].manifest, immutable=True)
+
+@app.route("/sprites/<version>/<int:sheet>")
+def sprite_sheet(version, sheet):
+    catalog=catalog_store.current
+    layout=catalog.derived["sprites"]
+    if version != catalog.version or sheet >= len(layout.sheets):
+        return jsonify({"error": "Unknown sprite sheet"}), 404
+    fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+    try:
+        data = sprite_sheets.sheet(layout, sheet, fmt)
+    except OSError as e:
+        app.logger.warning("Sprite sheet %s unavailable: %s", sheet, e)
+        return jsonify({"error": "Sprite sheet unavailable"}), 502
+    if data is None:
+        # Sheets are built in the background (this worker may have started from a snapshot);
+        # until then the page falls back to single thumbnails
+        sprite_sheets.submit(catalog)
+        response = jsonify({"error": "Sprite sheet not built yet"})
+        response.headers["Retry-After"] = "60"
+        return response, 503
+    response = app.response_class(data, mimetype=f"image/{fmt}")
+    response.set_etag(f"{version}-{sheet}-{fmt}")
+    response.vary.add("Accept")
+    response.cache_control.public = True
+    response.cache_control.max_age = 365*24*60*60
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+@app.route("/cards/<int:card_id>")
+def card_by_id(card_id):
+    catalog=catalog_store.current
+    pos=catalog.positions.get(card_id)
+    if pos is None:
+        return jsonify({"error": "Unknown card"}), 404
+    return short_cache(jsonify(catalog.derived["prices"].annotate(pos, catalog.cards[pos])))
+
+@app.route("/cards", methods=["GET", "POST"])
+def cards_by_id():
+    # GET /cards?ids=1,2,3&name=... (cacheable) or POST {"ids": [...], "names": [...]} for whole collections
+    if request.method == "POST":
+        data=json_body()
+        ids, names=data.get("ids", []), data.get("names", [])
+    else:
+        try:
+            ids=[int(value) for value in request.args.get("ids", "").split(",") if value]
+        except ValueError:
+            return jsonify({"error": "ids must be a comma-separated list of card ids"}), 400
+        names=request.args.getlist("name")
+    if not card_ids(ids) or None in ids or not isinstance(names, list) or len(ids) + len(names) > MAX_CARD_LOOKUP:
+        return jsonify({"error": f"Pass at most {MAX_CARD_LOOKUP} card ids and names"}), 400
+    catalog=catalog_store.current
+    prices=catalog.derived["prices"]
+    name_index=catalog.derived["names"]
+    found, missing = {}, []
+    for card_id in ids:
+        pos=catalog.positions.get(card_id)
+        if pos is None:
+            missing.append(card_id)
+        else:
+            found[pos]=None
+    for name in names:
+        pos=name_index.first(name) if isinstance(name, str) else None
+        if pos is None:
+            missing.append(name)
+        else:
+            found[pos]=None
+    response=jsonify({"cards": [prices.annotate(pos, catalog.cards[pos]) for pos in found], "missing": missing})
+    return short_cache(response) if request.method == "GET" else response
+
+@app.route("/suggest")
+def suggest():
+    # GET /suggest?q=blue-eyes wh&limit=8: names completing what's typed into a search box
+    try:
+        limit=int(request.args.get("limit", SUGGEST_LIMIT))
+    except ValueError:
+        limit=0
+    if not 1 <= limit <= MAX_SUGGEST_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {MAX_SUGGEST_LIMIT}"}), 400
+    query=request.args.get("q", "")[:MAX_SUGGEST_QUERY]
+    suggestions=catalog_store.current.derived["suggest"].suggest(query, limit)
+    return short_cache(jsonify({"suggestions": [{"name": name, "id": card_id} for name, card_id in suggestions]}))
+
+@app.route("/shop")
+def shop():
+    per_page=50
+    sort=request.args.get("sort","").strip()
+    descending=sort.startswith("-")
+    sort=sort.lstrip("-")
+    if sort and sort not in SORT_KEYS:
+        return jsonify({"error": f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+    ranges=[request.args.get(name, type=int) for name in ("min_price", "max_price", "min_boost", "max_boost")]
+    start=max(request.args.get("page", 0, type=int), 0)*per_page
+    catalog=catalog_store.current
+    prices=catalog.derived["prices"]
+    key=("shop", sort, descending, *ranges, catalog.version)
+    selected=query_cache.get_or_compute(key, lambda: prices.select(sort, descending, *ranges))
     end=start+per_page
-    return jsonify(filtered[start:end])
+    return jsonify({
+        "cards": [prices.annotate(pos, catalog.cards[pos]) for pos in selected[start:end]],
+        "total": len(selected),
+    })
+
+@app.route("/img/<int:card_id>/<size>")
+def card_image(card_id, size):
+    catalog = catalog_store.current
+    pos = catalog.positions.get(card_id)
+    if size not in THUMBNAIL_SIZES or pos is None:
+        return jsonify({"error": "Unknown card or size"}), 404
+    # Browsers that can decode WebP say so in Accept; everyone else gets JPEG
+    fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+    try:
+        data = image_cache.thumbnail(card_id, catalog.cards[pos]["img"], size, fmt)
+    except (requests.RequestException, OSError) as e:
+        app.logger.warning("Image %s unavailable: %s", card_id, e)
+        return jsonify({"error": "Image unavailable"}), 502
+    response = app.response_class(data, mimetype=f"image/{fmt}")
+    response.set_etag(f"{card_id}-{size}-{fmt}")
+    response.vary.add("Accept")
+    response.cache_control.public = True
+    response.cache_control.max_age = 365*24*60*60
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+# ------------------------
+# Player API (profile lives server-side, keyed by a cookie)
+# ------------------------
+PLAYER_COOKIE = "player_id"
+
+def current_player():
+    if "player_id" not in g:
+        player_id = request.cookies.get(PLAYER_COOKIE, "")
+        if len(player_id) != 32 or not player_id.isalnum():
+            player_id = g.new_player_id = uuid.uuid4().hex
+        g.player_id = player_id
+    return g.player_id
+
+@app.after_request
+def set_player_cookie(response):
+    if "new_player_id" in g:
+        response.set_cookie(PLAYER_COOKIE, g.new_player_id, max_age=10*365*24*60*60, httponly=True, samesite="Lax")
+    return response
+
+def json_body():
+    # force: navigator.sendBeacon can't always set the content type
+    data = request.get_json(force=True, silent=True)
+    return data if isinstance(data, dict) else {}
+
+def card_ids(values):
+    return isinstance(values, list) and all(value is None or type(value) is int for value in values)
+
+def deck_lists(deck):
+    """``(main, extra)`` from a ``{"main": [...], "extra": [...]}`` deck, or None if it isn't one."""
+    if not isinstance(deck, dict) or not card_ids(deck.get("main")) or not card_ids(deck.get("extra")):
+        return None
+    return deck["main"], deck["extra"]
+
+@app.route("/api/player")
+def player_profile():
+    click_buffer.flush(current_player())
+    return jsonify(player_store.profile(current_player()))
+
+@app.route("/api/player/clicks", methods=["POST"])
+def player_clicks():
+    data = json_body()
+    clicks, seq = data.get("clicks"), data.get("seq")
+    if type(clicks) is not int or type(seq) is not int or not (0 <= clicks <= MAX_INTEGER and 0 <= seq <= MAX_INTEGER):
+        return jsonify({"error": f"clicks and seq must be integers from 0 to {MAX_INTEGER}"}), 400
+    return jsonify(click_buffer.add(current_player(), clicks, seq))
+
+@app.route("/api/player/buy", methods=["POST"])
+def player_buy():
+    card_id = json_body().get("card_id")
+    catalog = catalog_store.current
+    pos = catalog.positions.get(card_id) if type(card_id) is int else None
+    if pos is None:
+        return jsonify({"error": "Unknown card"}), 404
+    prices = catalog.derived["prices"]
+    # The purchase is checked against the stored balance, so pending clicks must land first
+    click_buffer.flush(current_player())
+    try:
+        result = player_store.buy(current_player(), card_id, prices.price[pos], prices.boost[pos])
+    except PlayerError as e:
+        return jsonify({"error": str(e)}), 400
+    click_buffer.forget(current_player())
+    return jsonify(result)
+
+@app.route("/api/player/deck", methods=["PUT"])
+def player_deck():
+    data = json_body()
+    main, extra = data.get("main"), data.get("extra")
+    if not card_ids(main) or not card_ids(extra):
+        return jsonify({"error": "main and extra must be lists of card ids"}), 400
+    errors = catalog_store.current.derived["decks"].validate(main, extra)
+    if errors:
+        return jsonify({"error": errors[0], "errors": errors}), 400
+    try:
+        player_store.save_deck(current_player(), main, extra)
+    except PlayerError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"main": main, "extra": extra})
+
+@app.route("/api/player/deck/export")
+def export_player_deck():
+    deck = player_store.profile(current_player())["deck"]
+    if request.args.get("format") == "ydk":
+        response = app.response_class(to_ydk(deck["main"], deck["extra"]), mimetype="text/plain")
+        response.headers["Content-Disposition"] = "attachment; filename=deck.ydk"
+        return response
+    return jsonify({"code": encode_deck(deck["main"], deck["extra"])})
+
+@app.route("/api/player/deck/import", methods=["POST"])
+def import_player_deck():
+    # {"code": "..."} or {"ydk": "..."}; replaces the current deck
+    try:
+        main, extra = read_deck(json_body())
+    except DeckError as e:
+        return jsonify({"error": str(e)}), 400
+    errors = catalog_store.current.derived["decks"].validate(main, extra, owned=player_store.owned(current_player()))
+    if errors:
+        return jsonify({"error": errors[0], "errors": errors}), 400
+    try:
+        player_store.save_deck(current_player(), main, extra)
+    except PlayerError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"main": main, "extra": extra})
+
+@app.route("/api/decks/convert", methods=["POST"])
+def convert_decks():
+    # NDJSON in, NDJSON out: one deck per line ({"code"}, {"ydk"} or {"main", "extra"}), one result per line
+    fmt = request.args.get("to", "code")
+    if fmt not in DECK_FORMATS:
+        return jsonify({"error": f"to must be one of {', '.join(DECK_FORMATS)}"}), 400
+    rules = catalog_store.current.derived["decks"] if request.args.get("validate") else None
+    stream = request.stream
+
+    def convert():
+        for line in iter(lambda: stream.readline(MAX_LINE), b""):
+            if not line.strip():
+                continue
+            if len(line) == MAX_LINE and not line.endswith(b"\n"):
+                # Drain the rest of an oversized line so it gets one error, not one per chunk
+                rest = line
+                while len(rest) == MAX_LINE and not rest.endswith(b"\n"):
+                    rest = stream.readline(MAX_LINE)
+                result = {"error": f"Line is longer than {MAX_LINE} bytes"}
+            else:
+                try:
+                    main, extra = read_deck(json.loads(line))
+                    result = write_deck(main, extra, fmt)
+                    if rules:
+                        result["errors"] = rules.validate(main, extra)
+                except ValueError as e:  # bad JSON or a DeckError
+                    result = {"error": str(e)}
+            yield json.dumps(result, separators=(",", ":")) + "\n"
+
+    return app.response_class(stream_with_context(convert()), mimetype="application/x-ndjson")
+
+@app.route("/api/player/decks")
+def player_saved_decks():
+    return jsonify(player_store.saved_decks(current_player()))
+
+@app.route("/api/player/decks", methods=["PUT"])
+def save_player_decks():
+    # {"decks": {name: {"main": [...], "extra": [...]}}}: valid decks are saved, the rest reported
+    decks = json_body().get("decks")
+    if not isinstance(decks, dict) or len(decks) > MAX_BATCH:
+        return jsonify({"error": f"decks must be an object of at most {MAX_BATCH} named decks"}), 400
+    rules = catalog_store.current.derived["decks"]
+    owned = player_store.owned(current_player())
+    valid, errors = {}, {}
+    for name, deck in decks.items():
+        lists = deck_lists(deck)
+        problems = rules.validate(*lists, owned=owned) if lists else ["main and extra must be lists of card ids"]
+        if problems:
+            errors[name] = problems
+        else:
+            valid[name] = {"main": lists[0], "extra": lists[1]}
+    try:
+        player_store.save_decks(current_player(), valid)
+    except PlayerError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"saved": list(valid), "errors": errors})
+
+@app.route("/api/decks/validate", methods=["POST"])
+def validate_decks():
+    # Rules only, no collection: {"decks": [{"main": [...], "extra": [...]}, ...]}
+    decks = json_body().get("decks")
+    if not isinstance(decks, list) or len(decks) > MAX_BATCH:
+        return jsonify({"error": f"decks must be a list of at most {MAX_BATCH} decks"}), 400
+    rules = catalog_store.current.derived["decks"]
+    results = []
+    for deck in decks:
+        lists = deck_lists(deck)
+        problems = rules.validate(*lists) if lists else ["main and extra must be lists of card ids"]
+        results.append({"valid": not problems, "errors": problems})
+    return jsonify({"results": results})
+
+@app.route("/api/player/import", methods=["POST"])
+def player_import():
+    data = json_body()
+    coins, names = data.get("coins"), data.get("cards")
+    if type(coins) is not int or not 0 <= coins <= MAX_IMPORT_VALUE or not isinstance(names, list) or len(names) > MAX_CARD_LOOKUP:
+        return jsonify({"error": f"coins must be an integer from 0 to {MAX_IMPORT_VALUE} and cards a list of names"}), 400
+    catalog = catalog_store.current
+    prices = catalog.derived["prices"]
+    name_index = catalog.derived["names"]
+    positions = dict.fromkeys(pos for name in names if isinstance(name, str) for pos in name_index.all(name))
+    # The client's word is all there is, so the whole save is valued at shop prices and capped
+    if coins + sum(prices.price[pos] for pos in positions) > MAX_IMPORT_VALUE:
+        return jsonify({"error": f"A saved profile can be worth at most {MAX_IMPORT_VALUE:,} Yugi Coins"}), 400
+    cards = [(catalog.cards.ids[pos], prices.boost[pos]) for pos in positions]
+    try:
+        player_store.import_profile(current_player(), coins, cards)
+    except PlayerError as e:
+        return jsonify({"error": str(e)}), 409
+    click_buffer.forget(current_player())
+    return jsonify(player_store.profile(current_player()))
+
+@app.route("/api/player/stats")
+def player_stats():
+    return jsonify(click_buffer.stats())
+
+@app.route("/catalog/stats")
+def catalog_stats():
+    return jsonify(dict(catalog_store.stats, query_cache=query_cache.stats(), images=image_cache.stats()))
+
+# ------------------------
+# CLI
+# ------------------------
+@app.cli.command("prefetch-images")
+@click.option("--fetchers", type=int, default=None, help="concurrent upstream downloads")
+@click.option("--workers", type=int, default=None, help="resize processes (default: all cores)")
+def prefetch_images(fetchers, workers):
+    """Download and resize every card image missing from the thumbnail cache."""
+    options = {k: v for k, v in (("fetchers", fetchers), ("workers", workers)) if v}
+    def report(stats):
+        click.echo(f"{stats['done']}/{stats['cards']} cards, {stats['images']} images, "
+                   f"{stats['failed']} failed, {stats['images_per_second']} images/s")
+    stats = prefetch(image_cache, catalog_store.current.cards, progress=report, **options)
+    if stats["stopped"]:
+        raise click.ClickException(f"The catalog's thumbnails need about {stats['estimated_bytes'] >> 20} MB; "
+                                   f"raise IMAGE_CACHE_MB (now {image_cache.max_bytes >> 20})")
+    if not stats["cards"]:
+        click.echo("All thumbnails already cached")
 
 # ------------------------
 # Run server
@@ -0,0 +1,63 @@
+"""Compare the memory held by the catalog as a list of dicts vs. a CardTable.
+
+Uses the local snapshot (data/catalog.bin) when there is one, otherwise a
+synthetic catalog of the same size and shape.
+
+    python benchmarks/catalog_memory.py [--cards 13000]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import TYPES, CardTable, load_snapshot
+
+def synthetic_cards(count):
+    rng = random.Random(0)
+    words = ["Blue-Eyes", "White", "Dragon", "Dark", "Magician", "Elemental", "HERO", "Cyber", "Knight", "of", "the", "Gate"]
+    return [{
+        "id": 10000000 + i,
+        "name": " ".join(rng.choice(words) for _ in range(rng.randint(2, 5))),
+        "type": rng.choice(TYPES[:-1]),
+        "atk": rng.randrange(0, 5001, 100),
+        "defense": rng.choice([rng.randrange(0, 5001, 100), None]),
+        "img": f"https://images.ygoprodeck.com/images/cards/{10000000 + i}.jpg",
+    } for i in range(count)]
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=13000, help="synthetic catalog size when there is no snapshot")
+    args = parser.parse_args()
+
+    snapshot = load_snapshot()
+    raw = snapshot[0].to_dicts() if snapshot else synthetic_cards(args.cards)
+    source = "snapshot" if snapshot else "synthetic"
+    # Rebuild from JSON text each time so no strings are shared with `raw`
+    text = json.dumps(raw)
+    dicts, dict_size = measure(lambda: json.loads(text))
+    table, table_size = measure(lambda: CardTable.from_dicts(json.loads(text)))
+    assert [card["name"] for card in table] == [card["name"] for card in dicts]
+
+    print(f"{len(dicts)} cards ({source})")
+    print(f"list of dicts: {dict_size / 1024 / 1024:8.2f} MiB  ({dict_size / len(dicts):6.0f} B/card)")
+    print(f"CardTable:     {table_size / 1024 / 1024:8.2f} MiB  ({table_size / len(dicts):6.0f} B/card)")
+    print(f"ratio:         {dict_size / table_size:8.1f}x")
+    if snapshot:
+        _, mapped_size = measure(lambda: load_snapshot()[0])
+        print(f"mapped snapshot (heap only, pages shared via the OS page cache): {mapped_size / 1024:.1f} KiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Deck validation throughput: whole decks and single slot changes.
+
+Builds the rules for the fake YGOPRODeck catalog, then validates random decks
+(roughly the shape a player builds: some repeated cards, a godly card now and
+then) and times Deck.check on single slot changes of a full deck.
+
+    python benchmarks/deck_validation.py [--cards 13000] [--decks 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_ygoprodeck
+from catalog import Catalog, normalize_card
+from decks import SECTIONS, Deck, DeckRules
+from pricing import PriceTable
+
+def random_decks(rules, count, rng):
+    main_ids = [rules.cards.ids[pos] for pos in range(len(rules.cards)) if rules.playable[pos] and not rules.extra[pos]]
+    extra_ids = [rules.cards.ids[pos] for pos in range(len(rules.cards)) if rules.extra[pos]]
+    decks = []
+    for _ in range(count):
+        main = [rng.choice(main_ids) for _ in range(20)]
+        main += rng.sample(main, 10)  # repeats, some of them past the copy limit
+        extra = [rng.choice(extra_ids) for _ in range(SECTIONS["extra"])]
+        decks.append((main, extra))
+    return decks
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=13000)
+    parser.add_argument("--decks", type=int, default=20000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    catalog = Catalog([normalize_card(card) for card in fake_ygoprodeck.make_cards(args.cards, "http://fake")])
+    started = time.perf_counter()
+    rules = DeckRules(catalog, PriceTable(catalog.cards))
+    print(f"rules for {len(catalog)} cards built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    decks = random_decks(rules, args.decks, rng)
+    started = time.perf_counter()
+    invalid = sum(1 for main, extra in decks if rules.validate(main, extra))
+    elapsed = time.perf_counter() - started
+    print(f"whole decks:  {args.decks / elapsed:10.0f} decks/s  ({elapsed / args.decks * 1e6:.1f} us/deck, "
+          f"{invalid} of {args.decks} invalid)")
+
+    deck = Deck(rules)
+    deck.fill(*decks[0])
+    moves = [(section, rng.randrange(size), rng.choice(range(len(catalog))))
+             for section, size in SECTIONS.items() for _ in range(args.decks * 5)]
+    started = time.perf_counter()
+    for section, index, pos in moves:
+        deck.check(section, index, pos)
+    elapsed = time.perf_counter() - started
+    print(f"single slots: {len(moves) / elapsed:10.0f} checks/s ({elapsed / len(moves) * 1e9:.0f} ns/check)")
+
+if __name__ == "__main__":
+    main()
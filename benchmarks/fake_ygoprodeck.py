@@ -0,0 +1,134 @@
+"""A local stand-in for the YGOPRODeck card API, for benchmarks and manual testing.
+
+Serves a synthetic catalog at /api/v7/cardinfo.php and a placeholder card image
+(a full-size JPEG, needs Pillow) for every /images/... path, optionally after a
+delay to simulate a slow upstream. The catalog carries an ETag and Last-Modified
+and answers conditional requests with 304; --fail makes the first N catalog
+requests answer 503 to exercise retries.
+
+    python benchmarks/fake_ygoprodeck.py [--port 8765] [--cards 13000] [--delay 0] [--fail 0]
+    CATALOG_API_URL=http://127.0.0.1:8765/api/v7/cardinfo.php python app.py
+"""
+import argparse
+import email.utils
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PATH = "/api/v7/cardinfo.php"
+TYPES = ["Normal Monster", "Effect Monster", "XYZ Monster", "Synchro Monster", "Fusion Monster",
+         "Ritual Monster", "Link Monster", "Pendulum Effect Monster", "Spell Card", "Trap Card"]
+WORDS = ["Blue-Eyes", "White", "Dragon", "Dark", "Magician", "Elemental", "HERO", "Cyber", "Knight", "Gate",
+         "Guardian", "Red-Eyes", "Black", "Warrior", "Fairy", "Machine", "Sky", "Striker", "Pot", "Greed"]
+
+def make_cards(count, base_url):
+    rng = random.Random(0)
+    cards = []
+    for i in range(count):
+        card_id = 10000000 + i
+        card_type = rng.choice(TYPES)
+        card = {
+            "id": card_id,
+            "name": f"{' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4)))} {i}",
+            "type": card_type,
+            "desc": "Lorem ipsum " * rng.randint(5, 40),
+            "race": rng.choice(["Dragon", "Spellcaster", "Warrior", "Normal", "Continuous"]),
+            "card_images": [{"id": card_id, "image_url": f"{base_url}/images/cards/{card_id}.jpg",
+                             "image_url_small": f"{base_url}/images/cards_small/{card_id}.jpg"}],
+            "card_prices": [{"tcgplayer_price": f"{rng.random() * 10:.2f}"}],
+        }
+        if "Monster" in card_type:
+            card.update(atk=rng.randrange(0, 5001, 100), level=rng.randint(1, 12), attribute=rng.choice(["DARK", "LIGHT"]))
+            if "Link" not in card_type:
+                card["def"] = rng.randrange(0, 5001, 100)
+        cards.append(card)
+    return cards
+
+def make_image(width=421, height=614):
+    from PIL import Image
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 80, 40)).save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+class FakeYGOPRODeck(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, cards=13000, delay=0.0, fail=0):
+        super().__init__(address, Handler)
+        self.delay = delay
+        self.fail = fail
+        self.base_url = f"http://{address[0]}:{self.server_address[1]}"
+        self.set_cards(make_cards(cards, self.base_url))
+        self.requests = self.image_requests = self.not_modified = 0
+        self._image = None
+
+    def set_cards(self, cards):
+        """Replace the catalog, as an upstream update would (new ETag and Last-Modified)."""
+        self.body = json.dumps({"data": cards}).encode()
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        self.last_modified = email.utils.formatdate(usegmt=True)
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = make_image()
+        return self._image
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        path = self.path.split("?")[0]
+        if path == API_PATH:
+            if self.server.fail > 0:
+                self.server.fail -= 1
+                self.send_error(503)
+                return
+            if self.headers.get("If-None-Match") == self.server.etag:
+                self.server.not_modified += 1
+                self.send_response(304)
+                self.send_header("ETag", self.server.etag)
+                self.end_headers()
+                return
+            body, content_type = self.server.body, "application/json"
+        elif path.startswith("/images/"):
+            self.server.image_requests += 1
+            body, content_type = self.server.image, "image/jpeg"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if path == API_PATH:
+            self.send_header("ETag", self.server.etag)
+            self.send_header("Last-Modified", self.server.last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+def start(port=0, cards=13000, delay=0.0, fail=0):
+    """Start the fake in a background thread and return the server (``server.base_url`` + API_PATH)."""
+    server = FakeYGOPRODeck(("127.0.0.1", port), cards, delay, fail)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cards", type=int, default=13000)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--fail", type=int, default=0, help="answer the first N catalog requests with 503")
+    args = parser.parse_args()
+    server = FakeYGOPRODeck(("127.0.0.1", args.port), args.cards, args.delay, args.fail)
+    print(f"Serving {args.cards} cards at {server.base_url}{API_PATH}")
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Peak memory of catalog ingestion: json.load of the whole document vs. streaming.
+
+Each method runs in a fresh subprocess that parses a recorded upstream
+response into a CardTable; the report is its peak RSS above the RSS it had
+before parsing. The recording is made once, from CATALOG_API_URL with
+--record, or otherwise from the fake YGOPRODeck catalog.
+
+    python benchmarks/ingest_memory.py [--file data/cardinfo.json] [--record] [--cards 13000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from catalog import API_URL, DATA_DIR, CardTable, normalize_card
+from catalog_client import CHUNK_SIZE, iter_array
+
+METHODS = ("json", "stream")
+
+def record(path, url, cards):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if url:
+        import requests
+        with requests.get(url, timeout=(5, 120), stream=True) as response, open(path, "wb") as f:
+            response.raise_for_status()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+    else:
+        import fake_ygoprodeck
+        with open(path, "w") as f:
+            json.dump({"data": fake_ygoprodeck.make_cards(cards, "https://images.ygoprodeck.com")}, f)
+
+def ingest(method, path):
+    with open(path, "rb") as f:
+        if method == "json":
+            return CardTable.from_dicts(map(normalize_card, json.load(f)["data"]))
+        chunks = iter(lambda: f.read(CHUNK_SIZE), b"")
+        return CardTable.from_dicts(map(normalize_card, iter_array(chunks, "data")))
+
+def status_kib(field):
+    # VmHWM (peak RSS) starts over at exec, unlike ru_maxrss which a child inherits from its parent
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(f"{field}:"))
+
+def measure(method, path):
+    before = status_kib("VmRSS")
+    started = time.perf_counter()
+    table = ingest(method, path)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"cards": len(table), "peak_kib": status_kib("VmHWM") - before, "seconds": elapsed}))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", default=os.path.join(DATA_DIR, "cardinfo.json"), help="recorded upstream response")
+    parser.add_argument("--record", action="store_true", help=f"(re)record the file from {API_URL}")
+    parser.add_argument("--cards", type=int, default=13000, help="fake catalog size when recording without --record")
+    parser.add_argument("--measure", choices=METHODS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(args.measure, args.file)
+        return
+
+    if args.record or not os.path.exists(args.file):
+        record(args.file, API_URL if args.record else None, args.cards)
+    size = os.path.getsize(args.file)
+    print(f"{args.file}: {size / 1024 / 1024:.1f} MiB")
+    for method in METHODS:
+        output = subprocess.run([sys.executable, __file__, "--file", args.file, "--measure", method],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output)
+        print(f"{method:>6}: {result['cards']} cards, peak +{result['peak_kib'] / 1024:7.1f} MiB RSS, "
+              f"{result['seconds']:.2f}s")
+
+if __name__ == "__main__":
+    main()
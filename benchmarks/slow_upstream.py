@@ -0,0 +1,127 @@
+"""Load test: request throughput while the upstream card API is slow.
+
+Starts the fake YGOPRODeck API with a delay, boots gunicorn against it with a
+catalog max age of one second (so the refresh threads are constantly stuck on
+the slow upstream) and hammers the app from concurrent clients, once per worker
+class. Every --image-every'th request is a cold /img for a card not seen yet,
+which has to wait on the upstream inside the request; the rest are served from
+memory, and their latency shows whether those waits hold them up. Compare with
+--delay 0 for the unloaded baseline.
+
+    python benchmarks/slow_upstream.py [--delay 5] [--clients 32] [--seconds 10] [--image-every 10]
+
+On 1 CPU with gunicorn 23.0.0, 2 workers and 32 clients, with a 5s upstream:
+
+    sync      memory 5.3 req/s (p50 5210 ms)   cold image 0.7 req/s (p50 10230 ms)
+    gthread   memory 19.9 req/s (p50 92 ms)    cold image 3.0 req/s (p50 5168 ms)
+
+A sync worker stuck on an upstream image fetch holds up every request queued
+behind it; gthread keeps serving from memory (its rate here is bounded by the
+clients, most of which are waiting on their own image). Without cold images
+(--image-every 0) sync is ahead, 517 vs 411 req/s, and with --delay 0 the two
+are even (263 vs 251 req/s from memory): threads only pay off when requests
+wait on the network.
+"""
+import argparse
+import itertools
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_ygoprodeck
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ["/load_cards?search=dragon", "/shop/cards?type=Spell", "/load_cards?atk=2000-2999", "/", "/catalog/stats"]
+# Card ids of the fake catalog
+FIRST_CARD_ID = 10000000
+
+def wait_until_up(url, proc, deadline=120):
+    started = time.time()
+    while time.time() - started < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            if proc.poll() is not None:
+                raise SystemExit("gunicorn exited during startup")
+            time.sleep(0.1)
+    raise SystemExit("gunicorn did not come up")
+
+def hammer(base, clients, seconds, image_every):
+    latencies, errors = {"memory": [], "image": []}, [0]
+    stop = time.time() + seconds
+    # A new card for every image request, so each one is a cache miss that goes upstream
+    cold_cards = itertools.count(FIRST_CARD_ID)
+
+    def client(offset):
+        i = offset
+        while time.time() < stop:
+            if image_every and i % image_every == 0:
+                kind, path = "image", f"/img/{next(cold_cards)}/deck"
+            else:
+                kind, path = "memory", PATHS[i % len(PATHS)]
+            started = time.perf_counter()
+            try:
+                urllib.request.urlopen(base + path, timeout=30).read()
+                latencies[kind].append(time.perf_counter() - started)
+            except OSError:
+                errors[0] += 1
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0]
+
+def run(worker_class, upstream, args):
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, CATALOG_API_URL=upstream, CATALOG_DIR=data_dir, CATALOG_MAX_AGE="1",
+                   IMAGE_DIR=os.path.join(data_dir, "images"), SPRITE_DIR=os.path.join(data_dir, "sprites"),
+                   CATALOG_RETRY_DELAY="1", GUNICORN_WORKER_CLASS=worker_class, WEB_CONCURRENCY=str(args.workers),
+                   # gunicorn turns a sync worker into gthread whenever threads > 1
+                   GUNICORN_THREADS="1" if worker_class == "sync" else os.environ.get("GUNICORN_THREADS", "8"))
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{args.port}", "app:app"]
+        proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stderr=subprocess.DEVNULL)
+        try:
+            base = f"http://127.0.0.1:{args.port}"
+            wait_until_up(base + "/catalog/stats", proc)
+            latencies, errors = hammer(base, args.clients, args.seconds, args.image_every)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait()
+    print(f"{worker_class:>8}: errors {errors}")
+    for kind, times in latencies.items():
+        times.sort()
+        if not times:
+            continue
+        p99 = times[int(len(times) * 0.99)]
+        print(f"{kind:>16}: {len(times) / args.seconds:8.1f} req/s | p50 {statistics.median(times) * 1000:7.1f} ms"
+              f" | p99 {p99 * 1000:7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=5.0, help="upstream response delay in seconds")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--image-every", type=int, default=10, help="every Nth request is a cold image (0: none)")
+    args = parser.parse_args()
+    upstream = fake_ygoprodeck.start(delay=args.delay)
+    print(f"upstream delay {args.delay}s, {args.clients} clients, {args.workers} workers")
+    for worker_class in ("sync", "gthread"):
+        run(worker_class, upstream.base_url + fake_ygoprodeck.API_PATH, args)
+    print(f"upstream requests served: {upstream.requests} ({upstream.image_requests} images)")
+
+if __name__ == "__main__":
+    main()
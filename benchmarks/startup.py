@@ -0,0 +1,77 @@
+"""Boot gunicorn with and without preload and report boot time and per-worker memory.
+
+RSS counts shared pages in every process that maps them; PSS splits shared pages
+between the processes, so summed PSS is the real cost of the worker pool.
+Needs an existing snapshot (start the app once) so the run doesn't measure the
+upstream API.
+
+    python benchmarks/startup.py [--workers 4] [--port 8099]
+
+With 4 workers, a 13k-card fake catalog, gunicorn 23.0.0 and 1 CPU: the JSON
+snapshot before the shared memory map booted in 4.4s at 158.5 MiB total PSS;
+the memory map without preload in 3.5s at 136.0 MiB and with preload in 1.4s at
+43.5 MiB.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def memory_kib(pid, field):
+    path = f"/proc/{pid}/smaps_rollup" if field == "Pss" else f"/proc/{pid}/status"
+    with open(path) as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+def run(preload, workers, port):
+    cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--workers", str(workers),
+           "--bind", f"127.0.0.1:{port}", "app:app"]
+    env = dict(os.environ, GUNICORN_PRELOAD="1" if preload else "0")
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+                break
+            except OSError:
+                if proc.poll() is not None:
+                    raise SystemExit("gunicorn exited during startup")
+                time.sleep(0.05)
+        # Include the time until every worker has been forked, not just the first to answer
+        while len(children(proc.pid)) < workers:
+            time.sleep(0.05)
+        boot = time.perf_counter() - started
+        time.sleep(1)
+        pids = children(proc.pid)
+        rss = [memory_kib(pid, "VmRSS") for pid in pids]
+        pss = [memory_kib(pid, "Pss") for pid in pids]
+        return boot, rss, pss
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+    for preload in (False, True):
+        boot, rss, pss = run(preload, args.workers, args.port)
+        label = "preload" if preload else "no preload"
+        print(f"{label:>10}: boot {boot:5.2f}s | RSS/worker avg {sum(rss) / len(rss) / 1024:6.1f} MiB"
+              f" | PSS total {sum(pss) / 1024:6.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Autocomplete latency: p50/p99 of Suggester.suggest over random prefixes.
+
+Queries are prefixes (1-12 characters) of random card names, starting at the
+name or at one of its words, and a share of them get one typo (a swapped,
+dropped, doubled or replaced letter) so the edit-distance fallback is timed too.
+Uses a recorded upstream response when --file is given (see ingest_memory.py),
+otherwise the fake YGOPRODeck catalog.
+
+    python benchmarks/suggest_latency.py [--file data/cardinfo.json] [--cards 13000] [--queries 20000] [--typos 0.2]
+"""
+import argparse
+import json
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_ygoprodeck
+from catalog import Catalog, normalize_card
+from search import NameIndex, Suggester
+
+def load_cards(path, count):
+    if path:
+        with open(path) as f:
+            return json.load(f)["data"]
+    return fake_ygoprodeck.make_cards(count, "http://fake")
+
+def typo(text, rng):
+    i = rng.randrange(len(text))
+    kind = rng.randrange(4)
+    if kind == 0 and i + 1 < len(text):
+        return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+    if kind == 1 and len(text) > 1:
+        return text[:i] + text[i + 1:]
+    if kind == 2:
+        return text[:i] + text[i] + text[i:]
+    return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+
+def random_queries(names, count, typos, rng):
+    queries = []
+    for _ in range(count):
+        name = rng.choice(names).lower()
+        starts = [0] + [i + 1 for i, char in enumerate(name) if char == " "]
+        start = rng.choice(starts) if rng.random() < 0.3 else 0
+        query = name[start:start + rng.randint(1, 12)].strip() or name[:1]
+        if len(query) >= 4 and rng.random() < typos:
+            query = typo(query, rng)
+        queries.append(query)
+    return queries
+
+def percentile(ordered, share):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", help="recorded upstream response to take card names from")
+    parser.add_argument("--cards", type=int, default=13000)
+    parser.add_argument("--queries", type=int, default=20000)
+    parser.add_argument("--typos", type=float, default=0.2, help="share of queries with one typo")
+    parser.add_argument("-k", type=int, default=8)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    catalog = Catalog([normalize_card(card) for card in load_cards(args.file, args.cards)])
+    started = time.perf_counter()
+    suggester = Suggester(catalog.cards, NameIndex(catalog.cards))
+    print(f"{len(suggester.names)} names, {len(suggester.keys)} keys, built in "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+
+    queries = random_queries(suggester.names, args.queries, args.typos, rng)
+    timings = {"prefix": [], "fuzzy": []}
+    for query in queries:
+        started = time.perf_counter()
+        suggester.suggest(query, args.k)
+        elapsed = time.perf_counter() - started
+        # The edit-distance fallback runs when no name has the query as a prefix
+        fell_back = len(query) >= 3 and not suggester.suggest(query, args.k, max_edits=0)
+        timings["fuzzy" if fell_back else "prefix"].append(elapsed)
+    every = sorted(timings["prefix"] + timings["fuzzy"])
+    for label, values in (("all", every), ("prefix", sorted(timings["prefix"])), ("fallback", sorted(timings["fuzzy"]))):
+        if values:
+            print(f"{label:>8}: {len(values):6d} queries  p50 {percentile(values, 0.5) * 1e6:7.0f} us  "
+                  f"p99 {percentile(values, 0.99) * 1e6:7.0f} us  max {values[-1] * 1e6:7.0f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+import contextlib
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: a single process, nothing to coordinate
+    fcntl = None
+
+import requests
+
+from catalog_client import fetch_catalog
+
+log = logging.getLogger(__name__)
+
+# ------------------------
+# Settings
+# ------------------------
+API_URL = os.environ.get("CATALOG_API_URL", "https://db.ygoprodeck.com/api/v7/cardinfo.php")
+DATA_DIR = os.environ.get("CATALOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+SNAPSHOT_PATH = os.path.join(DATA_DIR, "catalog.bin")
+# Bump whenever the shape of a normalized card changes so old snapshots are refetched
+SNAPSHOT_SCHEMA = 4
+# Age after which the background thread refetches the catalog
+SNAPSHOT_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", 6 * 60 * 60))
+RETRY_DELAY = int(os.environ.get("CATALOG_RETRY_DELAY", 5 * 60))
+
+# ------------------------
+# Normalization
+# ------------------------
+# Monster frames, checked in order: "XYZ Pendulum Effect Monster" is an XYZ,
+# "Normal Tuner Monster" a Normal, and a monster matching none of them an Effect
+MONSTER_FRAMES = (('link', 'Link'), ('xyz', 'XYZ'), ('synchro', 'Synchro'), ('fusion', 'Fusion'),
+                  ('ritual', 'Ritual'), ('normal', 'Normal'))
+
+def normalize_type(card_type):
+    card_type = card_type.lower()
+    if 'monster' in card_type:
+        for word, frame in MONSTER_FRAMES:
+            if word in card_type:
+                return frame
+        return 'Effect'
+    elif 'spell' in card_type:
+        return 'Spell'
+    elif 'trap' in card_type:
+        return 'Trap'
+    return 'Unknown'
+
+def normalize_card(card_data):
+    level = card_data.get("level") or card_data.get("linkval") or 0
+    defense = card_data.get("def")
+    return {
+        "id": card_data.get("id"),
+        "name": card_data.get("name", "Unknown"),
+        "type": normalize_type(card_data.get("type", "Unknown")),
+        "pendulum": "pendulum" in card_data.get("type", "").lower(),
+        "atk": card_data.get("atk", 0) or 0,
+        "defense": defense if isinstance(defense, int) else None,
+        "level": level if isinstance(level, int) else 0,
+        "attribute": card_data.get("attribute", ""),
+        "race": card_data.get("race", ""),
+        "img": card_data["card_images"][0]["image_url"]
+    }
+
+def fetch_cards(url=API_URL, validators=None):
+    """``(CardTable, validators)``, or ``(None, validators)`` if the catalog is unchanged since ``validators``.
+
+    Each card is normalized and appended to the table as soon as it is parsed.
+    """
+    return fetch_catalog(url, lambda data: CardTable.from_dicts(map(normalize_card, data)), validators)
+
+# ------------------------
+# Columnar card storage
+# ------------------------
+TYPES = ('Normal', 'Effect', 'Ritual', 'Fusion', 'Synchro', 'XYZ', 'Link', 'Spell', 'Trap', 'Unknown')
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+EXTRA_DECK_TYPES = frozenset({'Fusion', 'Synchro', 'XYZ', 'Link'})
+# Code 0 ("") is anything missing or not listed, e.g. the attribute of a spell
+ATTRIBUTES = ('', 'DARK', 'LIGHT', 'EARTH', 'WATER', 'FIRE', 'WIND', 'DIVINE')
+RACES = ('', 'Aqua', 'Beast', 'Beast-Warrior', 'Creator-God', 'Cyberse', 'Dinosaur', 'Divine-Beast', 'Dragon',
+         'Fairy', 'Fiend', 'Fish', 'Illusion', 'Insect', 'Machine', 'Plant', 'Psychic', 'Pyro', 'Reptile', 'Rock',
+         'Sea Serpent', 'Spellcaster', 'Thunder', 'Warrior', 'Winged Beast', 'Wyrm', 'Zombie',
+         # Spell and trap "races"
+         'Normal', 'Field', 'Equip', 'Continuous', 'Quick-Play', 'Ritual', 'Counter')
+ATTRIBUTE_CODES = {name: code for code, name in enumerate(ATTRIBUTES)}
+RACE_CODES = {name: code for code, name in enumerate(RACES)}
+# Stored for a missing id or DEF (spells, traps and Link monsters have none)
+NO_VALUE = -2 ** 31
+
+class CardTable:
+    """The catalog as parallel arrays instead of one dict per card.
+
+    Numbers live in ``array`` columns, type, attribute and race as codes into
+    ``TYPES``, ``ATTRIBUTES`` and ``RACES``, and names and image URLs each in one
+    UTF-8 blob with a byte offsets array. Columns can also be memoryviews over a
+    mapped snapshot file. Indexing returns the card as a dict, with ``extra_deck``
+    derived from the type.
+    """
+
+    __slots__ = ("ids", "atk", "defense", "types", "levels", "attributes", "races", "pendulum",
+                 "names", "name_offsets", "imgs", "img_offsets")
+
+    def __init__(self, ids, atk, defense, types, levels, attributes, races, pendulum,
+                 names, name_offsets, imgs, img_offsets):
+        self.ids = ids
+        self.atk = atk
+        self.defense = defense
+        self.types = types
+        self.levels = levels
+        self.attributes = attributes
+        self.races = races
+        self.pendulum = pendulum
+        self.names = names
+        self.name_offsets = name_offsets
+        self.imgs = imgs
+        self.img_offsets = img_offsets
+
+    @classmethod
+    def from_dicts(cls, cards):
+        ids, atk, defense = array('i'), array('i'), array('i')
+        types, levels, attributes, races, pendulum = array('B'), array('B'), array('B'), array('B'), array('B')
+        names, imgs = [], []
+        name_offsets, img_offsets = array('I', [0]), array('I', [0])
+        for card in cards:
+            ids.append(NO_VALUE if card.get("id") is None else card["id"])
+            atk.append(card["atk"] or 0)
+            defense.append(card["defense"] if isinstance(card["defense"], int) else NO_VALUE)
+            types.append(TYPE_CODES.get(card["type"], TYPE_CODES['Unknown']))
+            levels.append(min(card.get("level") or 0, 255))
+            attributes.append(ATTRIBUTE_CODES.get(card.get("attribute"), 0))
+            races.append(RACE_CODES.get(card.get("race"), 0))
+            pendulum.append(bool(card.get("pendulum")))
+            name, img = card["name"].encode(), card["img"].encode()
+            names.append(name)
+            name_offsets.append(name_offsets[-1] + len(name))
+            imgs.append(img)
+            img_offsets.append(img_offsets[-1] + len(img))
+        return cls(ids, atk, defense, types, levels, attributes, races, pendulum,
+                   b"".join(names), name_offsets, b"".join(imgs), img_offsets)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += len(self.ids)
+        card_id, defense, card_type = self.ids[pos], self.defense[pos], TYPES[self.types[pos]]
+        return {
+            "id": None if card_id == NO_VALUE else card_id,
+            "name": self.name(pos),
+            "type": card_type,
+            "extra_deck": card_type in EXTRA_DECK_TYPES,
+            "pendulum": bool(self.pendulum[pos]),
+            "atk": self.atk[pos],
+            "defense": None if defense == NO_VALUE else defense,
+            "level": self.levels[pos],
+            "attribute": ATTRIBUTES[self.attributes[pos]],
+            "race": RACES[self.races[pos]],
+            "img": str(self.imgs[self.img_offsets[pos]:self.img_offsets[pos + 1]], "utf-8"),
+        }
+
+    def __iter__(self):
+        return (self[pos] for pos in range(len(self.ids)))
+
+    def name(self, pos):
+        return str(self.names[self.name_offsets[pos]:self.name_offsets[pos + 1]], "utf-8")
+
+    def key(self, pos):
+        card_id = self.ids[pos]
+        return self.name(pos) if card_id == NO_VALUE else card_id
+
+    def digest(self):
+        digest = hashlib.sha1()
+        for column in (self.ids, self.atk, self.defense, self.types, self.levels, self.attributes, self.races,
+                       self.pendulum, self.name_offsets, self.img_offsets):
+            digest.update(column.tobytes())
+        digest.update(self.names)
+        digest.update(self.imgs)
+        return digest.hexdigest()
+
+    def to_dicts(self):
+        return list(self)
+
+# ------------------------
+# Snapshot on disk
+# ------------------------
+# Binary layout: header, then the CardTable columns back to back in native byte
+# order (4-byte columns first so every view stays aligned), then the two UTF-8
+# blobs. Loading maps the file read-only and slices memoryviews out of it, so all
+# gunicorn workers share the same page-cache pages instead of each holding a copy.
+SNAPSHOT_MAGIC = b"YGOC"
+_HEADER = struct.Struct("<4sIdIIIB3x")
+
+def save_snapshot(cards, fetched_at, path=SNAPSHOT_PATH):
+    table = cards if isinstance(cards, CardTable) else CardTable.from_dicts(cards)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the target and rename so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_SCHEMA, fetched_at, len(table),
+                             len(table.names), len(table.imgs), sys.byteorder == "little"))
+        for column in (table.ids, table.atk, table.defense, table.name_offsets, table.img_offsets,
+                       table.types, table.levels, table.attributes, table.races, table.pendulum,
+                       table.names, table.imgs):
+            f.write(column)
+    os.replace(tmp_path, path)
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    try:
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, schema, fetched_at, count, names_size, imgs_size, little = _HEADER.unpack_from(buffer)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as e:
+        log.warning("Ignoring unreadable catalog snapshot %s: %s", path, e)
+        return None
+    if magic != SNAPSHOT_MAGIC or schema != SNAPSHOT_SCHEMA or little != (sys.byteorder == "little"):
+        return None
+    sizes = [4 * count] * 3 + [4 * (count + 1)] * 2 + [count] * 5 + [names_size, imgs_size]
+    if _HEADER.size + sum(sizes) != len(buffer):
+        log.warning("Ignoring truncated catalog snapshot %s", path)
+        return None
+    view = memoryview(buffer)
+    columns = []
+    offset = _HEADER.size
+    for size, fmt in zip(sizes, ("i", "i", "i", "I", "I", "B", "B", "B", "B", "B", None, None)):
+        column = view[offset:offset + size]
+        columns.append(column.cast(fmt) if fmt else column)
+        offset += size
+    ids, atk, defense, name_offsets, img_offsets, types, levels, attributes, races, pendulum, names, imgs = columns
+    return CardTable(ids, atk, defense, types, levels, attributes, races, pendulum,
+                     names, name_offsets, imgs, img_offsets), fetched_at
+
+def load_validators(path=SNAPSHOT_PATH):
+    """ETag/Last-Modified of the upstream response the snapshot at ``path`` was built from."""
+    try:
+        with open(f"{path}.validators.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_validators(validators, path=SNAPSHOT_PATH):
+    tmp_path = f"{path}.validators.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(validators, f)
+    os.replace(tmp_path, f"{path}.validators.json")
+
+@contextlib.contextmanager
+def snapshot_lock(path=SNAPSHOT_PATH):
+    """Serialize refreshes across worker processes sharing one snapshot."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+# ------------------------
+# Immutable catalog + background refresh
+# ------------------------
+def card_key(card):
+    return card["name"] if card.get("id") is None else card["id"]
+
+def diff_cards(old_cards, new_cards):
+    old = {card_key(card): card for card in old_cards}
+    new_keys = set()
+    added = changed = 0
+    for card in new_cards:
+        key = card_key(card)
+        new_keys.add(key)
+        if key not in old:
+            added += 1
+        elif old[key] != card:
+            changed += 1
+    removed = sum(1 for key in old if key not in new_keys)
+    return {"added": added, "removed": removed, "changed": changed}
+
+class Catalog:
+    """One version of the card list plus everything derived from it. Never mutated once published."""
+
+    def __init__(self, cards):
+        self.cards = cards if isinstance(cards, CardTable) else CardTable.from_dicts(cards)
+        self.positions = {self.cards.key(pos): pos for pos in range(len(self.cards))}
+        self.version = self.cards.digest()[:12]
+        self.derived = {}
+
+    def __len__(self):
+        return len(self.cards)
+
+class CatalogStore:
+    """Holds the current Catalog and swaps in a fully built replacement on refresh.
+
+    Request handlers read ``store.current`` once and use that object for the whole
+    request, so a refresh finishing mid-request is never observed half-built.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, max_age=SNAPSHOT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.current = Catalog([])
+        self.fetched_at = 0
+        self.stats = {
+            "version": self.current.version, "cards": 0, "refreshes": 0, "failures": 0,
+            "last_attempt": None, "last_success": None, "last_duration": None,
+            "last_error": None, "last_delta": None,
+        }
+        self._builders = []
+        self._listeners = []
+        self._refresh_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread_pid = None
+
+    def derive(self, name, builder):
+        """Register ``builder(catalog)``; its result is stored in ``catalog.derived[name]`` before every swap."""
+        self._builders.append((name, builder))
+        self.current.derived[name] = builder(self.current)
+
+    def on_refresh(self, listener):
+        """Register ``listener(old, new)``, called after a refresh this process fetched publishes a new version.
+
+        Workers that adopt a snapshot another worker wrote don't call it, so work
+        triggered here happens once per upstream change rather than once per worker.
+        """
+        self._listeners.append(listener)
+
+    def _publish(self, catalog):
+        for name, builder in self._builders:
+            catalog.derived[name] = builder(catalog)
+        self.current = catalog
+        self.stats["version"] = catalog.version
+        self.stats["cards"] = len(catalog)
+
+    def load(self):
+        snapshot = load_snapshot(self.path)
+        if snapshot:
+            self.fetched_at = snapshot[1]
+            self._publish(Catalog(snapshot[0]))
+            # A stale snapshot is served as-is; the refresh thread replaces it right away
+            return self.current
+        log.info("No catalog snapshot at %s, fetching before startup", self.path)
+        if not self.refresh():
+            log.error("Catalog fetch failed and no snapshot exists, starting with an empty catalog")
+        return self.current
+
+    def refresh(self):
+        with self._refresh_lock, snapshot_lock(self.path):
+            started = time.time()
+            self.stats["last_attempt"] = started
+            snapshot = load_snapshot(self.path)
+            fetched = False
+            if snapshot and snapshot[1] > self.fetched_at and started - snapshot[1] < self.max_age:
+                # Another worker refreshed while we were waiting for the lock
+                cards, fetched_at = snapshot
+            else:
+                try:
+                    # Only ask for a 304 when there is a snapshot to fall back on
+                    cards, validators = fetch_cards(validators=load_validators(self.path) if snapshot else None)
+                    if cards is None:
+                        log.info("Catalog unchanged upstream, keeping the snapshot")
+                        cards = snapshot[0]
+                    elif not cards:
+                        raise ValueError("upstream returned no cards")
+                except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+                    self.stats["failures"] += 1
+                    self.stats["last_error"] = str(e)
+                    log.warning("Catalog refresh failed: %s", e)
+                    return False
+                fetched_at = time.time()
+                save_snapshot(cards, fetched_at, self.path)
+                save_validators(validators, self.path)
+                # Serve the mapped file rather than the freshly parsed copy so workers share it
+                cards = load_snapshot(self.path)[0]
+                fetched = True
+            delta = diff_cards(self.current.cards, cards)
+            if any(delta.values()):
+                old = self.current
+                self._publish(Catalog(cards))
+                if fetched:
+                    for listener in self._listeners:
+                        listener(old, self.current)
+            self.fetched_at = fetched_at
+            duration = time.time() - started
+            self.stats.update(refreshes=self.stats["refreshes"] + 1, last_success=fetched_at,
+                              last_duration=round(duration, 3), last_error=None, last_delta=delta)
+            log.info("Catalog refreshed in %.2fs: %s", duration, delta)
+            return True
+
+    def ensure_refreshing(self):
+        # Compare pids so a forked worker starts its own thread instead of relying on the parent's
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name="catalog-refresh", daemon=True).start()
+
+    def _run(self):
+        while True:
+            due = self.fetched_at + self.max_age - time.time()
+            if due > 0:
+                self._wakeup.wait(due)
+                self._wakeup.clear()
+                continue
+            try:
+                ok = self.refresh()
+            except Exception:
+                log.exception("Unexpected error while refreshing the catalog")
+                ok = False
+            if not ok:
+                self._wakeup.wait(RETRY_DELAY)
+                self._wakeup.clear()
@@ -0,0 +1,162 @@
+import codecs
+import json
+import os
+import re
+import time
+
+import requests
+import requests.adapters
+from urllib3.util.retry import Retry
+
+# ------------------------
+# Settings
+# ------------------------
+# (connect, read) seconds; read is per socket read, FETCH_DEADLINE bounds the whole download
+FETCH_TIMEOUT = (5, 60)
+FETCH_DEADLINE = int(os.environ.get("UPSTREAM_DEADLINE", 180))
+UPSTREAM_POOL_SIZE = int(os.environ.get("UPSTREAM_POOL_SIZE", 10))
+# Connection errors and 429/5xx answers are retried after 0.5s, 1s, 2s, ... (or Retry-After)
+UPSTREAM_RETRIES = int(os.environ.get("UPSTREAM_RETRIES", 3))
+UPSTREAM_BACKOFF = float(os.environ.get("UPSTREAM_BACKOFF", 0.5))
+CHUNK_SIZE = 64 * 1024
+
+_session = None
+_session_pid = None
+
+def upstream_session():
+    """A pooled, retrying Session for upstream calls, recreated after fork so no socket is shared between workers."""
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        retry = Retry(total=UPSTREAM_RETRIES, backoff_factor=UPSTREAM_BACKOFF,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET", "HEAD"),
+                      raise_on_status=False)
+        _session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=UPSTREAM_POOL_SIZE, max_retries=retry)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+        _session_pid = os.getpid()
+    return _session
+
+def close_upstream_session():
+    """Close the pooled connections; a preloading master calls this so its workers don't inherit them."""
+    global _session
+    if _session is not None:
+        _session.close()
+        _session = None
+
+# ------------------------
+# Streaming JSON
+# ------------------------
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"\s*")
+_NUMBER_CHARS = "0123456789.eE+-"
+
+class _Reader:
+    """Parses JSON values one at a time from a stream of byte chunks.
+
+    Only the unconsumed tail of the text is kept, so memory is bounded by the
+    largest single value plus one chunk, not by the size of the document.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decode = codecs.getincrementaldecoder("utf-8")().decode
+        self.text = ""
+        self.pos = 0
+        self.done = False
+
+    def fill(self):
+        if self.done:
+            return False
+        chunk = next(self.chunks, None)
+        self.done = chunk is None
+        self.text = self.text[self.pos:] + self.decode(chunk or b"", final=self.done)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """The next non-whitespace character, or "" at the end of the stream."""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r} in the catalog, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                # A number cut by a chunk boundary parses as a shorter one ("1" of "1.5e3"), so only
+                # accept a value once the character after it can't continue it
+                if self.done or (end < len(self.text) and self.text[end] not in _NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            self.fill()
+
+def iter_array(chunks, key):
+    """Yield the elements of the array under ``key`` in a top-level JSON object, one at a time."""
+    reader = _Reader(chunks)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value()
+        reader.expect(":")
+        if name != key:
+            reader.value()
+        else:
+            reader.expect("[")
+            if reader.peek() == "]":
+                reader.pos += 1
+            else:
+                while True:
+                    yield reader.value()
+                    if reader.expect(",]") == "]":
+                        break
+        if reader.expect(",}") == "}":
+            return
+
+def iter_body(response, deadline):
+    """The response body in chunks, so a trickling upstream can't exceed ``deadline``."""
+    for chunk in response.iter_content(CHUNK_SIZE):
+        if time.monotonic() > deadline:
+            raise requests.Timeout(f"download took longer than {FETCH_DEADLINE}s")
+        yield chunk
+
+# ------------------------
+# Catalog fetch
+# ------------------------
+def fetch_catalog(url, build, validators=None, timeout=FETCH_TIMEOUT):
+    """GET the card list, conditionally if ``validators`` (``etag``/``last_modified``) are given.
+
+    ``build`` receives an iterator of raw card dicts parsed one by one from the
+    response stream, so it can keep only what it needs of each card; the raw
+    document never exists in memory as a whole. Returns ``(build(...), validators)``
+    with the validators of this response, or ``(None, validators)`` on a 304.
+    """
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    deadline = time.monotonic() + FETCH_DEADLINE
+    with upstream_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304:
+            return None, validators
+        response.raise_for_status()
+        validators = {key: response.headers[header] for key, header in
+                      (("etag", "ETag"), ("last_modified", "Last-Modified")) if header in response.headers}
+        return build(iter_array(iter_body(response, deadline), "data")), validators
@@ -0,0 +1,38 @@
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them rarely saves a packet
+MIN_SIZE = 1024
+# Preferred first when the client accepts several with equal quality
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+def compress(body, encoding, fast=False):
+    """``fast`` trades ratio for speed, for bodies compressed per request."""
+    if encoding == "br":
+        return brotli.compress(body, quality=4 if fast else 9)
+    return gzip.compress(body, compresslevel=5 if fast else 9, mtime=0)
+
+def negotiate(accept_encodings, available):
+    return accept_encodings.best_match([e for e in ENCODINGS if e in available]) or "identity"
+
+class Payload:
+    """An immutable response body with its compressed variants built up front."""
+
+    def __init__(self, body, mimetype):
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.variants = {"identity": body}
+        if len(body) >= MIN_SIZE:
+            for encoding in ENCODINGS:
+                self.variants[encoding] = compress(body, encoding)
+
+    def select(self, accept_encodings):
+        """Return ``(encoding, body, etag)`` for the best variant the client accepts."""
+        encoding = negotiate(accept_encodings, self.variants)
+        etag = self.etag if encoding == "identity" else f"{self.etag}-{encoding}"
+        return encoding, self.variants[encoding], etag
@@ -0,0 +1,252 @@
+import base64
+from array import array
+from collections import Counter
+
+from catalog import EXTRA_DECK_TYPES, TYPE_CODES
+from players import EXTRA_DECK_SIZE, MAIN_DECK_SIZE, MAX_INTEGER
+
+MAX_COPIES = 3
+MAX_GODLY = 1
+# Largest number of decks one batch request may validate or save
+MAX_BATCH = 1000
+SECTIONS = {"main": MAIN_DECK_SIZE, "extra": EXTRA_DECK_SIZE}
+# Longest card id a .ydk line may hold (ids fit in a signed 64-bit integer)
+MAX_ID_DIGITS = 19
+
+class DeckError(ValueError):
+    """A deck change the rules don't allow."""
+
+class DeckRules:
+    """Everything deck validation needs about one catalog version, one array lookup per card.
+
+    Copies are limited per card name (alternate artworks share a name but not
+    an id), so every position is mapped to the first position with its name.
+    """
+
+    def __init__(self, catalog, prices):
+        cards = catalog.cards
+        first = {}
+        self.cards = cards
+        self.positions = catalog.positions
+        self.name_key = array('I', (first.setdefault(cards.name(pos), pos) for pos in range(len(cards))))
+        extra_codes = {TYPE_CODES[name] for name in EXTRA_DECK_TYPES}
+        self.extra = array('B', (code in extra_codes for code in cards.types))
+        self.playable = array('B', (code != TYPE_CODES['Unknown'] for code in cards.types))
+        self.godly = prices.godly
+
+    def validate(self, main, extra, owned=None):
+        """Every rule a deck breaks, as a list of messages (empty when it's valid)."""
+        errors = []
+        for section, ids in (("main", main), ("extra", extra)):
+            if len(ids) > SECTIONS[section]:
+                errors.append(f"The {section} deck has more than {SECTIONS[section]} slots")
+        if errors:
+            return errors
+        if owned is not None:
+            errors += [f"Card {card_id} is not in your collection"
+                       for card_id in dict.fromkeys(main + extra) if card_id is not None and card_id not in owned]
+        return errors + Deck(self).fill(main, extra)
+
+class Deck:
+    """A main and extra deck plus the counters every rule is checked against.
+
+    Slots hold catalog positions. Copies per card name, godly cards and filled
+    slots are updated on every change, so ``check`` and ``place`` are O(1)
+    instead of rescanning the deck.
+    """
+
+    __slots__ = ("rules", "slots", "copies", "godly", "filled")
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.slots = {section: [None] * size for section, size in SECTIONS.items()}
+        self.copies = Counter()
+        self.godly = 0
+        self.filled = {section: 0 for section in SECTIONS}
+
+    def check(self, section, index, pos):
+        """Why ``pos`` can't go into slot ``index`` of ``section``, or None if it can."""
+        slots = self.slots.get(section)
+        if slots is None or not 0 <= index < len(slots):
+            return f"No slot {index} in the {section} deck"
+        if pos is None:
+            return None
+        rules = self.rules
+        if not rules.playable[pos]:
+            return f"{rules.cards.name(pos)} can't be used in a deck"
+        if rules.extra[pos] != (section == "extra"):
+            return f"{rules.cards.name(pos)} belongs in the {'extra' if rules.extra[pos] else 'main'} deck"
+        replaced = slots[index]
+        key = rules.name_key[pos]
+        same = replaced is not None and rules.name_key[replaced] == key
+        if self.copies[key] - same >= MAX_COPIES:
+            return f"At most {MAX_COPIES} copies of {rules.cards.name(pos)}"
+        if rules.godly[pos] and self.godly - (replaced is not None and rules.godly[replaced]) >= MAX_GODLY:
+            return f"At most {MAX_GODLY} godly card per deck"
+        return None
+
+    def place(self, section, index, pos):
+        """Put ``pos`` (or None to empty the slot) into a slot; raises DeckError if a rule forbids it."""
+        error = self.check(section, index, pos)
+        if error:
+            raise DeckError(error)
+        self._put(section, index, pos)
+
+    def _put(self, section, index, pos):
+        rules, slots = self.rules, self.slots[section]
+        replaced = slots[index]
+        if replaced is not None:
+            self.copies[rules.name_key[replaced]] -= 1
+            self.godly -= rules.godly[replaced]
+            self.filled[section] -= 1
+        if pos is not None:
+            self.copies[rules.name_key[pos]] += 1
+            self.godly += rules.godly[pos]
+            self.filled[section] += 1
+        slots[index] = pos
+
+    def fill(self, main, extra):
+        """Place lists of card ids slot by slot; returns the errors of the slots that were refused."""
+        errors = []
+        positions = self.rules.positions
+        for section, ids in (("main", main), ("extra", extra)):
+            for index, card_id in enumerate(ids):
+                pos = None if card_id is None else positions.get(card_id)
+                if card_id is not None and pos is None:
+                    errors.append(f"Unknown card {card_id}")
+                    continue
+                error = self.check(section, index, pos)
+                if error:
+                    errors.append(error)
+                else:
+                    self._put(section, index, pos)
+        return errors
+
+    def ids(self, section):
+        ids = self.rules.cards.ids
+        return [None if pos is None else ids[pos] for pos in self.slots[section]]
+
+# ------------------------
+# Deck codes and .ydk files
+# ------------------------
+# Deck code: a format byte, then for main and extra a varint count of entries
+# followed by varint (card id, copies) pairs, all urlsafe base64 without padding.
+# Empty slots are dropped; entries keep the order in which cards first appear.
+CODE_FORMAT = 1
+YDK_HEADER = "#created by Yugioh Clicker"
+
+def _varint(value, out):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise DeckError("Deck code is truncated")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise DeckError("Deck code is malformed")
+
+def encode_deck(main, extra):
+    if any(card_id is not None and card_id < 0 for card_id in main + extra):
+        raise DeckError("Card ids can't be negative")
+    out = bytearray([CODE_FORMAT])
+    for ids in (main, extra):
+        copies = Counter(card_id for card_id in ids if card_id is not None)
+        _varint(len(copies), out)
+        for card_id, count in copies.items():
+            _varint(card_id, out)
+            _varint(count, out)
+    return base64.urlsafe_b64encode(out).rstrip(b"=").decode("ascii")
+
+def decode_deck(code):
+    """``(main, extra)`` id lists from a deck code; raises DeckError for anything malformed."""
+    try:
+        data = base64.urlsafe_b64decode(code + "=" * (-len(code) % 4))
+    except (ValueError, TypeError):
+        raise DeckError("Deck code is not valid base64") from None
+    if not data or data[0] != CODE_FORMAT:
+        raise DeckError("Unknown deck code format")
+    pos = 1
+    sections = []
+    for size in SECTIONS.values():
+        count, pos = _read_varint(data, pos)
+        ids = []
+        for _ in range(count):
+            card_id, pos = _read_varint(data, pos)
+            copies, pos = _read_varint(data, pos)
+            if len(ids) + copies > size:
+                raise DeckError("Deck code has too many cards")
+            ids += [card_id] * copies
+        sections.append(ids)
+    if pos != len(data):
+        raise DeckError("Deck code has trailing data")
+    return sections[0], sections[1]
+
+def to_ydk(main, extra):
+    lines = [YDK_HEADER, "#main"]
+    lines += [str(card_id) for card_id in main if card_id is not None]
+    lines.append("#extra")
+    lines += [str(card_id) for card_id in extra if card_id is not None]
+    lines.append("!side")
+    return "\n".join(lines) + "\n"
+
+def from_ydk(text):
+    """``(main, extra)`` id lists from .ydk text; the side deck is ignored."""
+    sections = {"main": [], "extra": []}
+    current = None
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        if line in ("#main", "#extra"):
+            current = sections[line[1:]]
+        elif line == "!side":
+            current = None
+        elif line.startswith("#"):
+            continue
+        elif current is not None:
+            # isdigit() alone accepts digits like "²" that int() rejects
+            if not (line.isascii() and line.isdigit() and len(line) <= MAX_ID_DIGITS):
+                raise DeckError(f"Line {number} of the .ydk file is not a card id")
+            current.append(int(line))
+    for section, ids in sections.items():
+        if len(ids) > SECTIONS[section]:
+            raise DeckError(f"The {section} deck has more than {SECTIONS[section]} cards")
+    return sections["main"], sections["extra"]
+
+# ------------------------
+# Bulk conversion
+# ------------------------
+DECK_FORMATS = ("code", "ydk", "json")
+# Longest line accepted from an NDJSON batch; longer lines come back as errors
+MAX_LINE = 64 * 1024
+
+def read_deck(entry):
+    """``(main, extra)`` from ``{"code": ...}``, ``{"ydk": ...}`` or ``{"main": [...], "extra": [...]}``."""
+    if isinstance(entry, dict):
+        if isinstance(entry.get("code"), str):
+            return decode_deck(entry["code"])
+        if isinstance(entry.get("ydk"), str):
+            return from_ydk(entry["ydk"])
+        main, extra = entry.get("main"), entry.get("extra")
+        # Ids are stored as varints and SQLite integers: neither takes a negative or oversized one
+        if all(isinstance(ids, list) and all(i is None or type(i) is int and 0 <= i <= MAX_INTEGER for i in ids)
+               for ids in (main, extra)):
+            return main, extra
+    raise DeckError("A deck needs a code, a ydk text or main and extra lists of card ids")
+
+def write_deck(main, extra, fmt):
+    if fmt == "code":
+        return {"code": encode_deck(main, extra)}
+    if fmt == "ydk":
+        return {"ydk": to_ydk(main, extra)}
+    return {"main": main, "extra": extra}
@@ -0,0 +1,31 @@
+import os
+
+# The app module (and with it the catalog snapshot) is imported once in the
+# master and inherited by every worker on fork. The snapshot is a read-only
+# memory map, so its pages stay shared. On a first boot with no snapshot the
+# master fetches the catalog itself; pre_fork closes that connection.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+# Threaded workers: a request waiting on the network (a slow client, an upstream
+# fetch) holds one thread instead of the whole process. Catalog refreshes and
+# click flushes already run on their own background threads.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+def pre_fork(server, worker):
+    # Runs in the master: no pooled upstream socket may be carried into a worker
+    from catalog_client import close_upstream_session
+    close_upstream_session()
+
+def post_fork(server, worker):
+    # Each worker refreshes on its own thread; the snapshot lock makes sure only
+    # one of them actually hits the upstream API per refresh interval.
+    from app import catalog_store
+    catalog_store.ensure_refreshing()
+
+def worker_exit(server, worker):
+    # Runs in the worker after a graceful SIGTERM/SIGQUIT: write the clicks still buffered
+    from app import click_buffer
+    click_buffer.flush()
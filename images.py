@@ -0,0 +1,269 @@
+import io
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import requests
+from PIL import Image
+
+from catalog import DATA_DIR, NO_VALUE
+from catalog_client import FETCH_TIMEOUT, upstream_session
+
+log = logging.getLogger(__name__)
+
+# ------------------------
+# Settings
+# ------------------------
+IMAGE_DIR = os.environ.get("IMAGE_DIR", os.path.join(DATA_DIR, "images"))
+IMAGE_CACHE_BYTES = int(os.environ.get("IMAGE_CACHE_MB", 512)) * 1024 * 1024
+# Target widths in pixels: roughly 2x the CSS width of each place a card is shown
+THUMBNAIL_SIZES = {"grid": 400, "shop": 360, "deck": 130}
+FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+QUALITY = 80
+ORIGINAL = "original"
+# Bulk prefetch: concurrent upstream downloads, and processes resizing them
+PREFETCH_FETCHERS = int(os.environ.get("IMAGE_PREFETCH_FETCHERS", 8))
+PREFETCH_WORKERS = int(os.environ.get("IMAGE_PREFETCH_WORKERS", os.cpu_count() or 1))
+
+def make_thumbnail(data, width, fmt):
+    """Resize the image bytes ``data`` to ``width`` (keeping the aspect ratio) and encode as ``fmt``."""
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGB")
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, FORMATS[fmt], quality=QUALITY)
+        return out.getvalue()
+
+def fetch_image(url):
+    response = upstream_session().get(url, timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+    return response.content
+
+# ------------------------
+# On-disk cache
+# ------------------------
+class ImageCache:
+    """Upstream originals and their thumbnails on disk, evicted least-recently-used past ``max_bytes``.
+
+    Recency is the file mtime (touched on every hit), so it survives restarts.
+    Each worker keeps its own bookkeeping of the shared directory; a file another
+    worker evicted is simply fetched or rendered again.
+    """
+
+    def __init__(self, root=IMAGE_DIR, max_bytes=IMAGE_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.fetches = self.evictions = 0
+        self._lock = threading.Lock()
+        self._card_locks = {}
+        self._files = OrderedDict()
+        self.total = 0
+        os.makedirs(root, exist_ok=True)
+        found = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._files[path] = size
+            self.total += size
+
+    def path(self, card_id, size, fmt):
+        return os.path.join(self.root, size, f"{card_id}.{fmt}")
+
+    def read(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.total -= self._files.pop(path, 0)
+            return None
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+        return data
+
+    def write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total += len(data) - self._files.pop(path, 0)
+            self._files[path] = len(data)
+            while self.total > self.max_bytes and len(self._files) > 1:
+                old_path, old_size = self._files.popitem(last=False)
+                self.total -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(old_path)
+                except FileNotFoundError:
+                    pass
+
+    def discard(self, path):
+        with self._lock:
+            self.total -= self._files.pop(path, 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _card_lock(self, card_id):
+        with self._lock:
+            return self._card_locks.setdefault(card_id, threading.Lock())
+
+    def original(self, card_id, url, keep=True):
+        path = self.path(card_id, ORIGINAL, "jpg")
+        data = self.read(path)
+        if data is None:
+            data = fetch_image(url)
+            self.fetches += 1
+            if keep:
+                self.write(path, data)
+        return data
+
+    def thumbnail(self, card_id, url, size, fmt):
+        """Thumbnail bytes, fetching the original and rendering only on a miss."""
+        path = self.path(card_id, size, fmt)
+        data = self.read(path)
+        if data is not None:
+            self.hits += 1
+            return data
+        # One fetch/render per card at a time; other threads wait and then hit the cache
+        with self._card_lock(card_id):
+            data = self.read(path)
+            if data is None:
+                self.misses += 1
+                data = make_thumbnail(self.original(card_id, url), THUMBNAIL_SIZES[size], fmt)
+                self.write(path, data)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._files), "bytes": self.total, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "fetches": self.fetches, "evictions": self.evictions}
+
+# ------------------------
+# Bulk prefetch
+# ------------------------
+def render_thumbnails(data, targets):
+    """Process-pool entry point: every ``(size, fmt)`` in ``targets`` rendered from one original."""
+    return [make_thumbnail(data, THUMBNAIL_SIZES[size], fmt) for size, fmt in targets]
+
+def prefetch(cache, cards, positions=None, fetchers=PREFETCH_FETCHERS, workers=PREFETCH_WORKERS, progress=None):
+    """Fill ``cache`` with every thumbnail of ``cards`` (or just ``positions``) that isn't on disk yet.
+
+    Originals are downloaded by a thread pool and resized in a process pool, a
+    chunk of cards at a time so only a chunk of originals is held in memory.
+    Originals are not kept once a card's thumbnails are written. Thumbnails
+    already on disk are skipped, which makes an interrupted run resumable and a
+    repeated one cheap, as long as the cache can hold every card's thumbnails:
+    after the first chunk the size of the whole catalog is estimated, and the
+    run stops (``stats["stopped"]``) rather than evict what it just rendered.
+    ``progress(stats)`` is called after every chunk. Returns the final stats.
+    """
+    targets = [(size, fmt) for size in THUMBNAIL_SIZES for fmt in FORMATS]
+    jobs = []
+    for pos in range(len(cards)) if positions is None else positions:
+        card_id = cards.ids[pos]
+        if card_id == NO_VALUE:
+            continue
+        missing = [(size, fmt) for size, fmt in targets if not os.path.exists(cache.path(card_id, size, fmt))]
+        if missing:
+            jobs.append((card_id, cards[pos]["img"], missing))
+    stats = {"cards": len(jobs), "done": 0, "images": 0, "failed": 0, "elapsed": 0.0, "images_per_second": 0.0,
+             "bytes": 0, "estimated_bytes": None, "stopped": False}
+    catalog_cards = sum(1 for pos in range(len(cards)) if cards.ids[pos] != NO_VALUE)
+    if not jobs:
+        return stats
+    started = time.perf_counter()
+    chunk = fetchers * 8
+    # spawn, not fork: this also runs from a thread inside a web worker
+    with ThreadPoolExecutor(fetchers) as fetch_pool, \
+            ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as render_pool:
+        for start in range(0, len(jobs), chunk):
+            fetching = {fetch_pool.submit(cache.original, card_id, url, keep=False): (card_id, missing)
+                        for card_id, url, missing in jobs[start:start + chunk]}
+            rendering = {}
+            for future in as_completed(fetching):
+                card_id, missing = fetching[future]
+                try:
+                    data = future.result()
+                except (requests.RequestException, OSError) as e:
+                    log.warning("Image %s unavailable: %s", card_id, e)
+                    stats["failed"] += 1
+                    continue
+                rendering[render_pool.submit(render_thumbnails, data, missing)] = (card_id, missing)
+            for future in as_completed(rendering):
+                card_id, missing = rendering[future]
+                try:
+                    images = future.result()
+                except (OSError, ValueError) as e:
+                    log.warning("Image %s could not be resized: %s", card_id, e)
+                    stats["failed"] += 1
+                    continue
+                for (size, fmt), data in zip(missing, images):
+                    cache.write(cache.path(card_id, size, fmt), data)
+                    stats["bytes"] += len(data)
+                stats["images"] += len(images)
+                # Only thumbnails are served; an original left behind would push them out of the cache
+                cache.discard(cache.path(card_id, ORIGINAL, "jpg"))
+            stats["done"] = min(start + chunk, len(jobs))
+            stats["elapsed"] = round(time.perf_counter() - started, 2)
+            stats["images_per_second"] = round(stats["images"] / stats["elapsed"], 1) if stats["elapsed"] else 0.0
+            if stats["images"]:
+                stats["estimated_bytes"] = stats["bytes"] * len(targets) * catalog_cards // stats["images"]
+            if progress:
+                progress(stats)
+            if stats["estimated_bytes"] and stats["estimated_bytes"] > cache.max_bytes:
+                log.error("Thumbnails for %d cards need about %d MB but the image cache holds %d MB "
+                          "(IMAGE_CACHE_MB); stopping instead of evicting what was just rendered",
+                          catalog_cards, stats["estimated_bytes"] >> 20, cache.max_bytes >> 20)
+                stats["stopped"] = True
+                break
+    return stats
+
+class ImagePrefetcher:
+    """Runs ``prefetch`` in a background thread for cards added by catalog refreshes."""
+
+    def __init__(self, cache, workers=PREFETCH_WORKERS):
+        self.cache = cache
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._thread_pid = None
+
+    def submit(self, cards, positions):
+        if positions:
+            self.ensure_running()
+            self._queue.put((cards, positions))
+
+    def ensure_running(self):
+        # Same pid check as CatalogStore: a forked worker needs its own thread
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name="image-prefetch", daemon=True).start()
+
+    def _run(self):
+        while True:
+            cards, positions = self._queue.get()
+            try:
+                stats = prefetch(self.cache, cards, positions, workers=self.workers)
+                log.info("Prefetched images for %d new cards: %s", len(positions), stats)
+            except Exception:
+                log.exception("Image prefetch failed")
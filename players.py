@@ -0,0 +1,386 @@
+import abc
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from catalog import DATA_DIR
+
+log = logging.getLogger(__name__)
+
+# ------------------------
+# Settings
+# ------------------------
+PLAYER_DB = os.environ.get("PLAYER_DB", f"sqlite:///{os.path.join(DATA_DIR, 'players.sqlite3')}")
+# Clicks beyond this rate (after a burst allowance is used up) are dropped, not credited.
+# Enforced per worker process, like the seq check: see ClickBuffer
+MAX_CLICKS_PER_SECOND = 30
+CLICK_BURST = 100
+# Pending click deltas are written at least this often, or sooner once this many players are waiting
+CLICK_FLUSH_INTERVAL = float(os.environ.get("CLICK_FLUSH_INTERVAL", 1.0))
+CLICK_FLUSH_PLAYERS = int(os.environ.get("CLICK_FLUSH_PLAYERS", 500))
+# A player's delta that fails this many flushes in a row, even written on its own, is dropped
+CLICK_FLUSH_ATTEMPTS = 5
+MAIN_DECK_SIZE = 30
+EXTRA_DECK_SIZE = 15
+MAX_SAVED_DECKS = 50
+# Largest value SQLite stores in an INTEGER column; anything bigger fails the whole write
+MAX_INTEGER = 2 ** 63 - 1
+# A browser-only profile can't bring in more than this, counting its coins plus the shop price
+# of its cards (about 9 hours of clicking at the rate limit with no boosts)
+MAX_IMPORT_VALUE = 1_000_000
+
+class PlayerError(ValueError):
+    """A request the player store refuses (not enough coins, unknown card, ...)."""
+
+# ------------------------
+# Store interface
+# ------------------------
+class PlayerStore(abc.ABC):
+    """Server-side player profiles: coins, owned cards and the current deck.
+
+    Cards are referenced by catalog id. The click value is the sum of the boosts
+    of owned cards (1 with no cards), kept up to date on every purchase so click
+    batches never have to look at the collection.
+    """
+
+    @abc.abstractmethod
+    def profile(self, player_id):
+        """Coins, click_value, seq, owned card ids and the current deck."""
+
+    @abc.abstractmethod
+    def click_state(self, player_id):
+        """What ClickBuffer needs to credit clicks: coins, click_value, seq and last_click_at."""
+
+    @abc.abstractmethod
+    def apply_clicks(self, deltas):
+        """Write many ``(player_id, coins, seq, last_click_at)`` deltas in one transaction."""
+
+    @abc.abstractmethod
+    def buy(self, player_id, card_id, price, boost):
+        """Pay ``price`` for a card and add its ``boost``; raises PlayerError if that isn't possible."""
+
+    @abc.abstractmethod
+    def save_deck(self, player_id, main, extra):
+        """Replace the current deck with lists of card ids (None for an empty slot)."""
+
+    @abc.abstractmethod
+    def owned(self, player_id):
+        """The set of card ids the player owns."""
+
+    @abc.abstractmethod
+    def saved_decks(self, player_id):
+        """Named decks besides the current one, as ``{name: {"main": [...], "extra": [...]}}``."""
+
+    @abc.abstractmethod
+    def save_decks(self, player_id, decks):
+        """Create or replace many named decks in one transaction (already validated by the caller)."""
+
+    @abc.abstractmethod
+    def import_profile(self, player_id, coins, cards):
+        """One-time migration of a browser-only profile; ``cards`` is a list of (id, boost), checked by the caller."""
+
+def open_player_store(url=PLAYER_DB):
+    if url.startswith("sqlite:///"):
+        return SQLitePlayerStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported player store: {url}")
+
+def click_value(boost_total):
+    return boost_total or 1
+
+# ------------------------
+# SQLite backend
+# ------------------------
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    id TEXT PRIMARY KEY,
+    coins INTEGER NOT NULL DEFAULT 0,
+    boost_total INTEGER NOT NULL DEFAULT 0,
+    last_seq INTEGER NOT NULL DEFAULT 0,
+    last_click_at REAL NOT NULL,
+    deck TEXT
+);
+CREATE TABLE IF NOT EXISTS owned_cards (
+    player_id TEXT NOT NULL,
+    card_id INTEGER NOT NULL,
+    PRIMARY KEY (player_id, card_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS saved_decks (
+    player_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    deck TEXT NOT NULL,
+    PRIMARY KEY (player_id, name)
+) WITHOUT ROWID;
+"""
+
+class SQLitePlayerStore(PlayerStore):
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db().executescript(SCHEMA)
+
+    def _db(self):
+        # One connection per thread and per process: sqlite connections must not cross a fork
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.row_factory = sqlite3.Row
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Run the block in one IMMEDIATE transaction so read-modify-write is atomic across workers."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _player(self, db, player_id):
+        # Backdate last_click_at so a new player starts with a full CLICK_BURST allowance
+        db.execute("INSERT OR IGNORE INTO players (id, last_click_at) VALUES (?, ?)",
+                   (player_id, time.time() - CLICK_BURST / MAX_CLICKS_PER_SECOND))
+        return db.execute("SELECT * FROM players WHERE id = ?", (player_id,)).fetchone()
+
+    def profile(self, player_id):
+        with self._connect() as db:
+            row = self._player(db, player_id)
+            owned = [r[0] for r in db.execute("SELECT card_id FROM owned_cards WHERE player_id = ?", (player_id,))]
+        return {
+            "coins": row["coins"],
+            "click_value": click_value(row["boost_total"]),
+            "seq": row["last_seq"],
+            "owned": owned,
+            "deck": json.loads(row["deck"]) if row["deck"] else {"main": [], "extra": []},
+        }
+
+    def click_state(self, player_id):
+        with self._connect() as db:
+            row = self._player(db, player_id)
+        return {"coins": row["coins"], "click_value": click_value(row["boost_total"]),
+                "seq": row["last_seq"], "last_click_at": row["last_click_at"]}
+
+    def apply_clicks(self, deltas):
+        with self._connect() as db:
+            db.executemany("UPDATE players SET coins = coins + ?, last_seq = MAX(last_seq, ?),"
+                           " last_click_at = MAX(last_click_at, ?) WHERE id = ?",
+                           [(coins, seq, last_click_at, player_id) for player_id, coins, seq, last_click_at in deltas])
+
+    def buy(self, player_id, card_id, price, boost):
+        with self._connect() as db:
+            row = self._player(db, player_id)
+            if db.execute("SELECT 1 FROM owned_cards WHERE player_id = ? AND card_id = ?", (player_id, card_id)).fetchone():
+                raise PlayerError("Card already purchased")
+            if row["coins"] < price:
+                raise PlayerError("Not enough coins")
+            db.execute("INSERT INTO owned_cards (player_id, card_id) VALUES (?, ?)", (player_id, card_id))
+            db.execute("UPDATE players SET coins = coins - ?, boost_total = boost_total + ? WHERE id = ?",
+                       (price, boost, player_id))
+        return {"coins": row["coins"] - price, "click_value": click_value(row["boost_total"] + boost)}
+
+    def save_deck(self, player_id, main, extra):
+        with self._connect() as db:
+            self._player(db, player_id)
+            owned = {r[0] for r in db.execute("SELECT card_id FROM owned_cards WHERE player_id = ?", (player_id,))}
+            if len(main) > MAIN_DECK_SIZE or len(extra) > EXTRA_DECK_SIZE:
+                raise PlayerError("Deck has too many slots")
+            if any(card_id is not None and card_id not in owned for card_id in main + extra):
+                raise PlayerError("Deck contains cards you don't own")
+            db.execute("UPDATE players SET deck = ? WHERE id = ?",
+                       (json.dumps({"main": main, "extra": extra}), player_id))
+
+    def owned(self, player_id):
+        return {r[0] for r in self._db().execute("SELECT card_id FROM owned_cards WHERE player_id = ?", (player_id,))}
+
+    def saved_decks(self, player_id):
+        rows = self._db().execute("SELECT name, deck FROM saved_decks WHERE player_id = ? ORDER BY name", (player_id,))
+        return {name: json.loads(deck) for name, deck in rows}
+
+    def save_decks(self, player_id, decks):
+        with self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO saved_decks (player_id, name, deck) VALUES (?, ?, ?)",
+                           [(player_id, name, json.dumps(deck)) for name, deck in decks.items()])
+            count = db.execute("SELECT COUNT(*) FROM saved_decks WHERE player_id = ?", (player_id,)).fetchone()[0]
+            if count > MAX_SAVED_DECKS:
+                raise PlayerError(f"At most {MAX_SAVED_DECKS} saved decks")
+
+    def import_profile(self, player_id, coins, cards):
+        with self._connect() as db:
+            row = self._player(db, player_id)
+            owns_any = db.execute("SELECT 1 FROM owned_cards WHERE player_id = ? LIMIT 1", (player_id,)).fetchone()
+            if row["last_seq"] or row["coins"] or owns_any:
+                raise PlayerError("Profile already has progress")
+            db.executemany("INSERT OR IGNORE INTO owned_cards (player_id, card_id) VALUES (?, ?)",
+                           [(player_id, card_id) for card_id, _ in cards])
+            db.execute("UPDATE players SET coins = ?, boost_total = ? WHERE id = ?",
+                       (coins, sum(boost for _, boost in cards), player_id))
+
+# ------------------------
+# Write-behind click buffer
+# ------------------------
+class ClickBuffer:
+    """Coalesces click batches per player in memory and writes them in bulk.
+
+    Each player's coins, click value and sequence number are read from the store
+    once and then kept here, so a click batch is a dict update under a lock. A
+    background thread writes every pending delta in one transaction each
+    CLICK_FLUSH_INTERVAL, or as soon as CLICK_FLUSH_PLAYERS players are waiting.
+    Deltas are applied as increments, so purchases made by other workers in the
+    meantime are never overwritten. If a bulk write fails, every delta is retried
+    on its own so one that can't be written doesn't hold back the others; it is
+    dropped after CLICK_FLUSH_ATTEMPTS failures. Call ``flush()`` on shutdown.
+
+    The token bucket and the seq check live in this process only. With several
+    workers and no sticky sessions a player can earn up to MAX_CLICKS_PER_SECOND
+    per worker, and a batch retried on another worker before the first one
+    flushed is credited twice; the store keeps the highest seq either way.
+    """
+
+    def __init__(self, store, interval=CLICK_FLUSH_INTERVAL, max_players=CLICK_FLUSH_PLAYERS):
+        self.store = store
+        self.interval = interval
+        self.max_players = max_players
+        self._state = {}
+        self._pending = {}
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread_pid = None
+        self.batches = self.written = self.flushes = self.failures = self.dropped = 0
+        self.last_flush_ms = self.max_flush_ms = 0.0
+
+    def add(self, player_id, clicks, seq):
+        """Credit a click batch; returns the player's coins including everything still pending."""
+        loaded = None
+        while True:
+            with self._lock:
+                # Looked up and updated in one critical section: a flush in between may forget the state
+                state = self._state.get(player_id)
+                if state is None and loaded is not None:
+                    state = self._state[player_id] = loaded
+                if state is not None:
+                    return self._credit(player_id, state, clicks, seq)
+            loaded = self.store.click_state(player_id)
+
+    def _credit(self, player_id, state, clicks, seq):
+        # Called with self._lock held
+        if seq <= state["seq"]:
+            return {"coins": state["coins"], "seq": state["seq"]}
+        # Token bucket: refills at MAX_CLICKS_PER_SECOND, holds at most CLICK_BURST clicks
+        now = time.time()
+        allowance = min(CLICK_BURST, state.get("allowance", 0)
+                        + (now - state["last_click_at"]) * MAX_CLICKS_PER_SECOND)
+        credited = max(0, min(clicks, int(allowance)))
+        earned = credited * state["click_value"]
+        state.update(coins=state["coins"] + earned, seq=seq, last_click_at=now, allowance=allowance - credited)
+        self._pending[player_id] = self._pending.get(player_id, 0) + earned
+        self.batches += 1
+        self.ensure_flushing()
+        if len(self._pending) >= self.max_players:
+            self._wakeup.set()
+        return {"coins": state["coins"], "seq": seq}
+
+    def flush(self, player_id=None):
+        """Write pending deltas (all of them, or one player's before a purchase reads the balance)."""
+        with self._flush_lock:
+            with self._lock:
+                if player_id is None:
+                    taken, self._pending = self._pending, {}
+                elif player_id in self._pending:
+                    taken = {player_id: self._pending.pop(player_id)}
+                else:
+                    taken = {}
+                deltas = []
+                for pid, coins in taken.items():
+                    # A delta always has state; if it ever doesn't, still write the coins (MAX() keeps seq)
+                    state = self._state.get(pid, {})
+                    deltas.append((pid, coins, state.get("seq", 0), state.get("last_click_at", 0)))
+            if not deltas:
+                return 0
+            started = time.perf_counter()
+            failed = set()
+            try:
+                self.store.apply_clicks(deltas)
+            except Exception:
+                log.exception("Writing %d click deltas failed", len(deltas))
+                if len(deltas) == 1:
+                    failed.add(deltas[0][0])
+                # One at a time, so only the deltas that can't be written stay behind
+                for delta in deltas if len(deltas) > 1 else ():
+                    try:
+                        self.store.apply_clicks([delta])
+                    except Exception:
+                        failed.add(delta[0])
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                for pid in failed:
+                    attempts = self._attempts.get(pid, 0) + 1
+                    if attempts < CLICK_FLUSH_ATTEMPTS:
+                        self._attempts[pid] = attempts
+                        self._pending[pid] = self._pending.get(pid, 0) + taken[pid]
+                    else:
+                        log.error("Dropping %d coins for player %s after %d failed writes", taken[pid], pid, attempts)
+                        self._attempts.pop(pid, None)
+                        self.dropped += 1
+                self.failures += bool(failed)
+                # Forget players with nothing new so their next batch rereads the store
+                for pid in taken:
+                    if pid not in failed:
+                        self._attempts.pop(pid, None)
+                    if pid not in self._pending:
+                        self._state.pop(pid, None)
+                self.flushes += 1
+                self.written += len(deltas) - len(failed)
+                self.last_flush_ms = round(elapsed, 2)
+                self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            return len(deltas) - len(failed)
+
+    def forget(self, player_id):
+        """Drop cached state after something else changed the player (a purchase, an import)."""
+        with self._lock:
+            if player_id not in self._pending:
+                self._state.pop(player_id, None)
+
+    def ensure_flushing(self):
+        # Same pid check as CatalogStore: a forked worker needs its own thread
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name="click-flush", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # The thread must survive: it is the only thing flushing most players
+                log.exception("Unexpected error while flushing clicks")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pending_players": len(self._pending),
+                "batches": self.batches,
+                "rows_written": self.written,
+                "flushes": self.flushes,
+                "failures": self.failures,
+                "dropped": self.dropped,
+                "coalescing_ratio": round(self.batches / self.written, 2) if self.written else None,
+                "last_flush_ms": self.last_flush_ms,
+                "max_flush_ms": self.max_flush_ms,
+            }
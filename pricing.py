@@ -0,0 +1,63 @@
+from array import array
+from bisect import bisect_left
+from functools import partial
+
+# Godly tier cards - 3,500,000 coins each
+godly_tier_cards = ["Obelisk the Tormentor", "The Winged Dragon of Ra", "Slifer the Sky Dragon", "Pot of Greed"]
+GODLY_PRICE = 3500000
+GODLY_BOOST = 10000
+
+# Highest ATK of each shop bucket; anything above the last one is the top bucket
+ATK_THRESHOLDS = (999, 1999, 2999, 3999, 4999)
+BUCKET_PRICES = (500, 2000, 10000, 25000, 50000, 100000)
+# The top bucket is deliberately weak: cards priced 100,000+ only give a 25X boost
+BUCKET_BOOSTS = (8, 16, 50, 120, 250, 25)
+
+SORT_KEYS = ("price", "boost")
+
+class PriceTable:
+    """Price, boost and godly flag for every card of one catalog version.
+
+    Built in a single pass: each ATK is bucketed with bisect and the bucket mapped
+    through the price/boost tables, all inside ``map`` so the loop runs in C.
+    Godly cards are then patched in by name. Also keeps the catalog positions
+    sorted by price and by boost for the /shop listing.
+    """
+
+    def __init__(self, cards):
+        buckets = array('B', map(partial(bisect_left, ATK_THRESHOLDS), cards.atk))
+        self.price = array('i', map(BUCKET_PRICES.__getitem__, buckets))
+        self.boost = array('i', map(BUCKET_BOOSTS.__getitem__, buckets))
+        self.godly = array('B', bytes(len(buckets)))
+        godly_names = set(godly_tier_cards)
+        for pos in range(len(cards)):
+            if cards.name(pos) in godly_names:
+                self.price[pos] = GODLY_PRICE
+                self.boost[pos] = GODLY_BOOST
+                self.godly[pos] = 1
+        # sorted() is stable, so equal prices keep catalog order
+        self.order = {
+            "price": array('I', sorted(range(len(buckets)), key=self.price.__getitem__)),
+            "boost": array('I', sorted(range(len(buckets)), key=self.boost.__getitem__)),
+        }
+
+    def annotate(self, pos, card):
+        card["price"] = self.price[pos]
+        card["boost"] = self.boost[pos]
+        card["godly"] = bool(self.godly[pos])
+        return card
+
+    def select(self, sort="", descending=False, min_price=None, max_price=None, min_boost=None, max_boost=None):
+        """Positions sorted by ``sort`` (catalog order if empty) and filtered by price/boost ranges."""
+        positions = self.order[sort] if sort else range(len(self.price))
+        if descending:
+            positions = positions[::-1]
+        price, boost = self.price, self.boost
+        checks = [(column, low, high) for column, low, high in
+                  ((price, min_price, max_price), (boost, min_boost, max_boost))
+                  if low is not None or high is not None]
+        if not checks:
+            return positions
+        return [pos for pos in positions
+                if all((low is None or column[pos] >= low) and (high is None or column[pos] <= high)
+                       for column, low, high in checks)]
@@ -0,0 +1,419 @@
+import base64
+import json
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from catalog import TYPES
+
+# ------------------------
+# Filter buckets (same values as the ATK dropdowns)
+# ------------------------
+ATK_BUCKETS = ("0-999", "1000-1999", "2000-2999", "3000-3999", "4000-4999", "5000+")
+# Name substrings matching at least this many cards get their facet counts precomputed
+FACET_PRECOMPUTE = 1024
+
+def atk_bucket(atk):
+    atk = atk or 0
+    if atk <= 999:
+        return 0
+    return min(atk // 1000, 5)
+
+EMPTY = array('I')
+
+# ------------------------
+# Name index
+# ------------------------
+def normalize_name(name):
+    return " ".join(name.lower().split())
+
+class NameIndex:
+    """Normalized card name -> catalog positions, built once per catalog version.
+
+    Alternate artworks share a name, so a name maps to every position that has
+    it, in catalog order; ``first`` is the one used to resolve a name to an id.
+    """
+
+    def __init__(self, cards):
+        self.positions = {}
+        for pos in range(len(cards)):
+            self.positions.setdefault(normalize_name(cards.name(pos)), array('I')).append(pos)
+
+    def all(self, name):
+        return self.positions.get(normalize_name(name), EMPTY)
+
+    def first(self, name):
+        found = self.all(name)
+        return found[0] if found else None
+
+# ------------------------
+# Autocomplete
+# ------------------------
+# Sorts after any character a key can contain, so key + END bounds every key with that prefix
+END = "\U0010ffff"
+# Spelling alternatives tried per query word, and corrected queries looked up, before giving up
+MAX_CORRECTIONS = 3
+MAX_RETRIES = 8
+
+def _prefix_range(keys, prefix):
+    start = bisect_left(keys, prefix)
+    return start, bisect_left(keys, prefix + END, start)
+
+def close_words(words, token, max_edits, prefix=False, limit=MAX_CORRECTIONS):
+    """Entries of sorted ``words`` within ``max_edits`` of ``token`` (Damerau-Levenshtein), as ``{match: distance}``.
+
+    With ``prefix`` a word only has to start with something that close, and
+    the match is that prefix rather than the word. ``words`` is walked like a
+    trie: edit-distance rows are shared between words with a common prefix,
+    only the band within ``max_edits`` of the diagonal is computed, and every
+    word under a prefix that is already out of reach is skipped at once. Like
+    most autocompletes it trusts the first letter.
+    """
+    width = len(token) + 1
+    out = max_edits + 1
+    rows = [[min(j, out) for j in range(width)]]
+    path = ""
+    found = {}
+    i, end = _prefix_range(words, token[0])
+    while i < end and len(found) < limit:
+        word = words[i]
+        common = 0
+        shared = min(len(path), len(word))
+        while common < shared and path[common] == word[common]:
+            common += 1
+        del rows[common + 1:]
+        path = word[:common]
+        for depth in range(common, len(word)):
+            char, last = word[depth], rows[-1]
+            before = word[depth - 1] if depth else ""
+            row = [out] * width
+            row[0] = best = depth + 1 if depth < max_edits else out
+            for j in range(max(1, depth + 1 - max_edits), min(width, depth + 2 + max_edits)):
+                cell = last[j - 1] if token[j - 1] == char else last[j - 1] + 1
+                if row[j - 1] < cell:
+                    cell = row[j - 1] + 1
+                if last[j] < cell:
+                    cell = last[j] + 1
+                # Swapped neighbours ("dargon") count as one edit
+                if j > 1 and char == token[j - 2] and before == token[j - 1] and rows[-2][j - 2] < cell:
+                    cell = rows[-2][j - 2] + 1
+                if cell > out:
+                    cell = out
+                row[j] = cell
+                if cell < best:
+                    best = cell
+            rows.append(row)
+            path += char
+            if prefix and row[-1] <= max_edits:
+                # Every word under this prefix completes it
+                found.setdefault(path, row[-1])
+                i = _prefix_range(words, path)[1]
+                break
+            if best > max_edits:
+                # Nothing under this prefix can get back within reach
+                i = _prefix_range(words, path)[1]
+                break
+        else:
+            if not prefix and row[-1] <= max_edits:
+                found.setdefault(word, row[-1])
+            i += 1
+    return found
+
+class Suggester:
+    """Prefix and typo-tolerant name completion, built once per catalog version.
+
+    ``full`` holds the distinct normalized names and ``keys`` every word-start
+    suffix of them ("blue-eyes white dragon", "white dragon", "dragon"), both
+    sorted, so completions are a bisect plus a short forward scan, names that
+    start with the query first. When no name has the query as a prefix it is taken for a typo: each
+    word is matched against the vocabulary of name words (the last one as a
+    prefix, since it's still being typed) and the closest spellings are looked
+    up the same way.
+    """
+
+    def __init__(self, cards, name_index):
+        entries = sorted(name_index.positions.items())
+        self.full = [name for name, _ in entries]
+        self.names = [cards.name(positions[0]) for _, positions in entries]
+        self.ids = array('i', (cards.ids[positions[0]] for _, positions in entries))
+        pairs = []
+        for owner, (name, _) in enumerate(entries):
+            start = 0
+            while start != -1:
+                pairs.append((name[start:], owner))
+                start = name.find(" ", start)
+                start = start if start == -1 else start + 1
+        pairs.sort()
+        self.keys = [key for key, _ in pairs]
+        self.owners = array('I', (owner for _, owner in pairs))
+        # Numbers aren't spelled, so a mistyped one has no meaningful correction
+        self.words = sorted({word for name, _ in entries for word in name.split(" ") if word and not word.isdigit()})
+        self.vocabulary = frozenset(self.words)
+
+    def completions(self, query, k):
+        """Positions in ``names`` of up to ``k`` names with a word starting with ``query``, name starts first."""
+        pos, end = _prefix_range(self.full, query)
+        ranked = list(range(pos, min(end, pos + k)))
+        if len(ranked) < k:
+            pos, end = _prefix_range(self.keys, query)
+            # Names found above show up here too, so scan a little further than needed
+            ranked = list(dict.fromkeys(ranked + self.owners[pos:min(end, pos + 2 * k)].tolist()))[:k]
+        return ranked
+
+    def suggest(self, query, k=8, max_edits=None):
+        """Up to ``k`` ``(name, id)`` completions of ``query``; typos are tried only if no name has it as a prefix."""
+        query = normalize_name(query)
+        if not query:
+            return []
+        ranked = self.completions(query, k)
+        if not ranked and len(query) >= 3 and max_edits != 0:
+            for corrected in self.corrections(query, max_edits)[:MAX_RETRIES]:
+                ranked += [owner for owner in self.completions(corrected, k) if owner not in ranked][:k - len(ranked)]
+                if len(ranked) >= k:
+                    break
+        return [(self.names[owner], self.ids[owner]) for owner in ranked]
+
+    def corrections(self, query, max_edits=None):
+        """Respellings of ``query`` with its words swapped for close vocabulary words, fewest edits first."""
+        tokens = query.split(" ")
+        # (text, edits) of the cheapest respellings so far; edits add up, so the cheapest
+        # MAX_RETRIES of the whole query always extend the cheapest MAX_RETRIES of its start
+        respelled = [("", 0)]
+        for index, token in enumerate(tokens):
+            last = index == len(tokens) - 1
+            close = {token: 0}
+            if len(token) >= 3 and not token.isdigit() and (last or token not in self.vocabulary):
+                most = max_edits if max_edits is not None else (1 if len(token) < 7 else 2)
+                # One edit first: cheaper to walk, and closer words shouldn't be crowded out by farther ones
+                for edits in range(1, most + 1):
+                    close = close_words(self.words, token, edits, prefix=last)
+                    if close:
+                        break
+                if not close:
+                    if not last:
+                        return []
+                    close = {token: 0}
+            respelled = sorted(((f"{text} {word}" if index else word, total + distance)
+                                for text, total in respelled for word, distance in close.items()),
+                               key=lambda entry: entry[1])[:MAX_RETRIES]
+        return [text for text, total in respelled if total]
+
+# ------------------------
+# Search index
+# ------------------------
+class SearchIndex:
+    """Filters for /load_cards, built once per catalog version.
+
+    Every 1-, 2- and 3-character substring of each lowercased name gets a posting
+    list of card positions (ascending, i.e. catalog order). Short search terms are
+    answered by a single lookup; longer ones start from the rarest trigram and only
+    verify those candidates. Type, ATK bucket and (type, ATK bucket) pairs have
+    their own posting lists; when a name search is combined with filters the name
+    matches are checked against compact per-position code columns.
+
+    Facet counts (results per type and per ATK bucket) come from a type x bucket
+    matrix: precomputed for the whole catalog and for every substring matching at
+    least FACET_PRECOMPUTE names (the short searches that match half the catalog),
+    otherwise tallied from the name matches in the same pass that filters them.
+    """
+
+    def __init__(self, cards):
+        self.size = len(cards)
+        self.names = [cards.name(pos).lower() for pos in range(self.size)]
+        self.type_names = TYPES
+        # Shared with the CardTable rather than copied
+        self.types = cards.types
+        self.buckets = array('B', (atk_bucket(atk) for atk in cards.atk))
+        # Cell of the type x ATK bucket matrix each card counts towards
+        self.cells = array('B', (code * len(ATK_BUCKETS) + bucket for code, bucket in zip(self.types, self.buckets)))
+
+        grams = {}
+        for pos, name in enumerate(self.names):
+            for gram in {name[i:i + n] for n in (1, 2, 3) for i in range(len(name) - n + 1)}:
+                posting = grams.get(gram)
+                if posting is None:
+                    posting = grams[gram] = array('I')
+                posting.append(pos)
+        self.grams = grams
+
+        self.by_type = {name: array('I') for name in self.type_names}
+        self.by_atk = {name: array('I') for name in ATK_BUCKETS}
+        self.by_type_atk = {}
+        for pos in range(self.size):
+            type_code, atk_code = self.types[pos], self.buckets[pos]
+            self.by_type[self.type_names[type_code]].append(pos)
+            self.by_atk[ATK_BUCKETS[atk_code]].append(pos)
+            self.by_type_atk.setdefault((type_code, atk_code), array('I')).append(pos)
+        self.counts = [0] * (len(self.type_names) * len(ATK_BUCKETS))
+        for (type_code, atk_code), posting in self.by_type_atk.items():
+            self.counts[type_code * len(ATK_BUCKETS) + atk_code] = len(posting)
+        self.gram_counts = {}
+        for gram, posting in grams.items():
+            if len(posting) >= FACET_PRECOMPUTE:
+                matrix = array('I', bytes(4 * len(self.counts)))
+                for pos in posting:
+                    matrix[self.cells[pos]] += 1
+                self.gram_counts[gram] = matrix
+
+    def matching_names(self, search):
+        if len(search) <= 3:
+            return self.grams.get(search, EMPTY)
+        rarest = min((self.grams.get(search[i:i + 3], EMPTY) for i in range(len(search) - 2)), key=len)
+        names = self.names
+        return [pos for pos in rarest if search in names[pos]]
+
+    def query(self, search="", type_filter="", atk_filter=""):
+        """Positions of matching cards in catalog order. Unknown ATK values are ignored like before."""
+        type_code = atk_code = None
+        if type_filter:
+            if type_filter not in self.by_type:
+                return EMPTY
+            type_code = self.type_names.index(type_filter)
+        if atk_filter in self.by_atk:
+            atk_code = ATK_BUCKETS.index(atk_filter)
+
+        if not search:
+            if type_code is None and atk_code is None:
+                return range(self.size)
+            if atk_code is None:
+                return self.by_type[type_filter]
+            if type_code is None:
+                return self.by_atk[atk_filter]
+            return self.by_type_atk.get((type_code, atk_code), EMPTY)
+
+        # Checking the code columns per name match is cheaper than intersecting sets
+        matches = self.matching_names(search)
+        types, buckets = self.types, self.buckets
+        if type_code is not None and atk_code is not None:
+            return [pos for pos in matches if types[pos] == type_code and buckets[pos] == atk_code]
+        if type_code is not None:
+            return [pos for pos in matches if types[pos] == type_code]
+        if atk_code is not None:
+            return [pos for pos in matches if buckets[pos] == atk_code]
+        return matches
+
+    def query_with_facets(self, search="", type_filter="", atk_filter=""):
+        """query() plus facet counts, as a SearchResult.
+
+        Each facet applies the other one's filter but not its own, so a count is
+        what picking that option would return: with ``atk_filter`` set, the type
+        counts are per type within that bucket, and vice versa.
+        """
+        width = len(ATK_BUCKETS)
+        type_code = self.type_names.index(type_filter) if type_filter in self.by_type else None
+        atk_code = ATK_BUCKETS.index(atk_filter) if atk_filter in self.by_atk else None
+        if type_filter and type_code is None:
+            return SearchResult(EMPTY, self.facets([0] * len(self.counts), None, None))
+        if not search:
+            return SearchResult(self.query("", type_filter, atk_filter), self.facets(self.counts, type_code, atk_code))
+
+        cells = self.cells
+        wanted = [(type_code is None or cell // width == type_code) and (atk_code is None or cell % width == atk_code)
+                  for cell in range(len(self.counts))]
+        matrix = self.gram_counts.get(search)
+        if matrix is not None:
+            positions = self.grams[search]
+            if type_code is not None or atk_code is not None:
+                positions = [pos for pos in positions if wanted[cells[pos]]]
+            return SearchResult(positions, self.facets(matrix, type_code, atk_code))
+
+        # One pass over the name matches tallies the matrix and picks the results
+        matrix = [0] * len(self.counts)
+        positions = []
+        for pos in self.matching_names(search):
+            cell = cells[pos]
+            matrix[cell] += 1
+            if wanted[cell]:
+                positions.append(pos)
+        return SearchResult(positions, self.facets(matrix, type_code, atk_code))
+
+    def facets(self, matrix, type_code, atk_code):
+        width = len(ATK_BUCKETS)
+        return {
+            "type": {name: sum(matrix[code * width:(code + 1) * width]) if atk_code is None else matrix[code * width + atk_code]
+                     for code, name in enumerate(self.type_names)},
+            "atk": {name: sum(matrix[bucket::width]) if type_code is None else matrix[type_code * width + bucket]
+                    for bucket, name in enumerate(ATK_BUCKETS)},
+        }
+
+class SearchResult:
+    """Positions of a query with its facet counts; sized by its positions, for QueryCache."""
+
+    __slots__ = ("positions", "facets")
+
+    def __init__(self, positions, facets):
+        self.positions = positions
+        self.facets = facets
+
+    def __len__(self):
+        return len(self.positions)
+
+
+# ------------------------
+# Query result cache + cursors
+# ------------------------
+class QueryCache:
+    """LRU of query results keyed on (search, type, atk, catalog version).
+
+    Bounded by entry count, by the total number of cached positions and by age.
+    Keys include the catalog version, so entries for a replaced catalog simply
+    stop being hit and age out.
+    """
+
+    def __init__(self, max_entries=512, max_positions=2_000_000, ttl=300):
+        self.max_entries = max_entries
+        self.max_positions = max_positions
+        self.ttl = ttl
+        self.positions = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._remove(key)
+                self.expirations += 1
+            self.misses += 1
+        result = compute()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (now + self.ttl, result)
+            self.positions += len(result)
+            while self._entries and (len(self._entries) > self.max_entries or self.positions > self.max_positions):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return result
+
+    def _remove(self, key):
+        self.positions -= len(self._entries.pop(key)[1])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries), "positions": self.positions,
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "expirations": self.expirations,
+            }
+
+def encode_cursor(*fields):
+    return base64.urlsafe_b64encode(json.dumps(fields, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; raises ValueError for anything that isn't one of our cursors."""
+    try:
+        fields = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+    if not isinstance(fields, list):
+        raise ValueError("invalid cursor")
+    return fields
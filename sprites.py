@@ -0,0 +1,162 @@
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+from array import array
+
+import requests
+from PIL import Image
+
+from catalog import DATA_DIR, NO_VALUE
+from compression import Payload
+from images import FORMATS, QUALITY, THUMBNAIL_SIZES
+
+log = logging.getLogger(__name__)
+
+# ------------------------
+# Settings
+# ------------------------
+SPRITE_DIR = os.environ.get("SPRITE_DIR", os.path.join(DATA_DIR, "sprites"))
+# Each sheet is a SHEET_COLUMNS x SHEET_ROWS grid of deck-slot sized tiles
+SHEET_COLUMNS = 16
+SHEET_ROWS = 8
+TILE_WIDTH = THUMBNAIL_SIZES["deck"]
+TILE_HEIGHT = round(TILE_WIDTH * 614 / 421)  # card art aspect ratio
+
+class SpriteLayout:
+    """Which sheet and slot every card of one catalog version lands in.
+
+    Cards are ordered by shop price (stable, so catalog order within a tier):
+    players buy roughly tier by tier, so a collection tends to fill a few sheets
+    rather than touch one tile of many. The manifest sent to the browser lists
+    the card ids of each sheet in slot order.
+    """
+
+    def __init__(self, catalog, prices):
+        cards = catalog.cards
+        order = sorted((pos for pos in range(len(cards)) if cards.ids[pos] != NO_VALUE), key=prices.price.__getitem__)
+        per_sheet = SHEET_COLUMNS * SHEET_ROWS
+        self.version = catalog.version
+        self.sheets = [array('I', order[start:start + per_sheet]) for start in range(0, len(order), per_sheet)]
+        manifest = {
+            "version": self.version,
+            "tile": [TILE_WIDTH, TILE_HEIGHT],
+            "columns": SHEET_COLUMNS,
+            "rows": SHEET_ROWS,
+            "sheets": [[cards.ids[pos] for pos in sheet] for sheet in self.sheets],
+        }
+        self.manifest = Payload(json.dumps(manifest, separators=(",", ":")).encode(), "application/json")
+
+class SpriteSheets:
+    """Sprite sheet images, composed from the thumbnail cache off the request path.
+
+    ``submit(catalog)`` builds every sheet of a catalog version on a background
+    thread; requests only ever read finished sheets. Sheets are written to
+    ``root/<catalog version>/`` and kept for as long as that version is current;
+    directories of older versions are removed when a newer one is built. A sheet
+    with a tile that couldn't be fetched is not stored (it would be cached as
+    immutable) and is tried again the next time the version is submitted.
+    """
+
+    def __init__(self, image_cache, root=SPRITE_DIR):
+        self.image_cache = image_cache
+        self.root = root
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._thread_pid = None
+
+    def path(self, version, sheet, fmt):
+        return os.path.join(self.root, version, f"{sheet}.{fmt}")
+
+    def sheet(self, layout, sheet, fmt):
+        """Sheet image bytes, or None while it isn't built; raises IndexError for a sheet the layout doesn't have."""
+        layout.sheets[sheet]
+        try:
+            with open(self.path(layout.version, sheet, fmt), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def submit(self, catalog):
+        """Queue building the sheets of ``catalog``'s version, unless it is already queued."""
+        with self._lock:
+            if catalog.version in self._queued:
+                return
+            self._queued.add(catalog.version)
+        self.ensure_running()
+        self._queue.put(catalog)
+
+    def ensure_running(self):
+        # Same pid check as CatalogStore: a forked worker needs its own thread
+        if self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name="sprite-sheets", daemon=True).start()
+
+    def _run(self):
+        while True:
+            catalog = self._queue.get()
+            try:
+                incomplete = self.build(catalog, catalog.derived["sprites"])
+                if incomplete:
+                    log.warning("%d sprite sheets of catalog %s are missing tiles", incomplete, catalog.version)
+            except Exception:
+                log.exception("Building sprite sheets failed")
+            with self._lock:
+                self._queued.discard(catalog.version)
+            self._queue.task_done()
+
+    def build(self, catalog, layout):
+        """Write every sheet of ``layout`` not on disk yet; returns how many were left out for missing tiles."""
+        self._prune(layout.version)
+        incomplete = 0
+        for sheet, positions in enumerate(layout.sheets):
+            formats = [fmt for fmt in FORMATS if not os.path.exists(self.path(layout.version, sheet, fmt))]
+            if not formats:
+                continue
+            atlas, missing = self.compose(catalog, positions)
+            if missing:
+                incomplete += 1
+                continue
+            for fmt in formats:
+                out = io.BytesIO()
+                atlas.save(out, FORMATS[fmt], quality=QUALITY)
+                path = self.path(layout.version, sheet, fmt)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(out.getvalue())
+                os.replace(tmp_path, path)
+        return incomplete
+
+    def compose(self, catalog, positions):
+        """``(image, missing)``: the sheet, and how many of its tiles couldn't be fetched."""
+        # Always full size, even the last sheet, so the browser can position tiles by percentage
+        atlas = Image.new("RGB", (SHEET_COLUMNS * TILE_WIDTH, SHEET_ROWS * TILE_HEIGHT))
+        missing = 0
+        for slot, pos in enumerate(positions):
+            card = catalog.cards[pos]
+            try:
+                thumbnail = self.image_cache.thumbnail(card["id"], card["img"], "deck", "jpeg")
+            except (requests.RequestException, OSError) as e:
+                log.warning("Image %s unavailable for sprite sheet: %s", card["id"], e)
+                missing += 1
+                continue
+            with Image.open(io.BytesIO(thumbnail)) as tile:
+                if tile.size != (TILE_WIDTH, TILE_HEIGHT):
+                    tile = tile.resize((TILE_WIDTH, TILE_HEIGHT), Image.LANCZOS)
+                row, column = divmod(slot, SHEET_COLUMNS)
+                atlas.paste(tile, (column * TILE_WIDTH, row * TILE_HEIGHT))
+        return atlas, missing
+
+    def _prune(self, version):
+        try:
+            stale = [name for name in os.listdir(self.root) if name != version]
+        except FileNotFoundError:
+            return
+        for name in stale:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
@@ -0,0 +1,44 @@
+"""Shared setup: every test talks to a local fake of the YGOPRODeck API, never the real one.
+
+The fake is started and the app's settings are pointed at it (and at a scratch
+data directory) before any app module is imported, since they read their
+settings at import time.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+import fake_ygoprodeck
+
+CARDS = 200
+UPSTREAM = fake_ygoprodeck.start(cards=CARDS)
+DATA_DIR = tempfile.mkdtemp(prefix="yugioh-tests-")
+os.environ.update(
+    CATALOG_API_URL=UPSTREAM.base_url + fake_ygoprodeck.API_PATH,
+    CATALOG_DIR=DATA_DIR,
+    PLAYER_DB=f"sqlite:///{os.path.join(DATA_DIR, 'players.sqlite3')}",
+    IMAGE_DIR=os.path.join(DATA_DIR, "images"),
+    SPRITE_DIR=os.path.join(DATA_DIR, "sprites"),
+    # Retries still happen, just without the backoff sleeps
+    UPSTREAM_BACKOFF="0",
+)
+
+@pytest.fixture
+def upstream():
+    """The fake API, restored to its original catalog and counters after the test."""
+    if "app" in sys.modules:
+        # The app's own background work (sprite sheets for the first catalog) must not count
+        sys.modules["app"].sprite_sheets._queue.join()
+    UPSTREAM.requests = UPSTREAM.image_requests = UPSTREAM.not_modified = 0
+    yield UPSTREAM
+    UPSTREAM.fail = 0
+    UPSTREAM.set_cards(fake_ygoprodeck.make_cards(CARDS, UPSTREAM.base_url))
+
+@pytest.fixture
+def cards():
+    return fake_ygoprodeck.make_cards(CARDS, UPSTREAM.base_url)
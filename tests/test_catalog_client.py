@@ -0,0 +1,82 @@
+import json
+
+import pytest
+import requests
+
+from catalog_client import UPSTREAM_RETRIES, close_upstream_session, fetch_catalog, iter_array, upstream_session
+
+DOCUMENT = {
+    "meta": {"total": 3, "note": "before the data"},
+    "data": [
+        {"id": 1, "name": "Blue-Eyes White Dragon", "atk": 3000, "price": 1.5e3},
+        {"id": 2, "name": "Réé ☃ \U0001f409", "atk": -1, "ratio": 0.125, "tags": [[], {}, None, True]},
+        {"id": 12345678, "name": "Pot of Greed", "escaped": 'a "quoted" \\ name'},
+    ],
+    "after": [1, 2.5, "3"],
+}
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_array_every_split_point(indent):
+    data = json.dumps(DOCUMENT, indent=indent, ensure_ascii=False).encode()
+    for split in range(len(data) + 1):
+        assert list(iter_array([data[:split], data[split:]], "data")) == DOCUMENT["data"], split
+
+def test_iter_array_one_byte_chunks():
+    # Cuts every number and every multi-byte UTF-8 character
+    data = json.dumps(DOCUMENT, ensure_ascii=False).encode()
+    assert list(iter_array(chunked(data, 1), "data")) == DOCUMENT["data"]
+
+def test_iter_array_empty_and_missing():
+    assert list(iter_array([b'{"data": []}'], "data")) == []
+    assert list(iter_array([b'{"other": [1, 2]}'], "data")) == []
+    assert list(iter_array([b"{}"], "data")) == []
+
+def test_iter_array_rejects_malformed():
+    with pytest.raises(ValueError):
+        list(iter_array([b'{"data": [1, 2'], "data"))
+    with pytest.raises(ValueError):
+        list(iter_array([b'["data"]'], "data"))
+
+def url(upstream):
+    import fake_ygoprodeck
+    return upstream.base_url + fake_ygoprodeck.API_PATH
+
+def test_fetch_returns_cards_and_validators(upstream, cards):
+    fetched, validators = fetch_catalog(url(upstream), list)
+    assert fetched == cards
+    assert validators == {"etag": upstream.etag, "last_modified": upstream.last_modified}
+
+def test_fetch_conditional_not_modified(upstream):
+    _, validators = fetch_catalog(url(upstream), list)
+    fetched, again = fetch_catalog(url(upstream), list, validators)
+    assert fetched is None and again == validators
+    assert upstream.not_modified == 1
+
+def test_fetch_conditional_after_upstream_change(upstream, cards):
+    _, validators = fetch_catalog(url(upstream), list)
+    upstream.set_cards(cards[:10])
+    fetched, new_validators = fetch_catalog(url(upstream), list, validators)
+    assert fetched == cards[:10]
+    assert new_validators["etag"] != validators["etag"]
+    assert upstream.not_modified == 0
+
+def test_fetch_retries_server_errors(upstream, cards):
+    upstream.fail = UPSTREAM_RETRIES
+    fetched, _ = fetch_catalog(url(upstream), list)
+    assert fetched == cards
+    assert upstream.requests == UPSTREAM_RETRIES + 1
+
+def test_fetch_gives_up_after_retries(upstream):
+    upstream.fail = UPSTREAM_RETRIES + 1
+    with pytest.raises(requests.HTTPError):
+        fetch_catalog(url(upstream), list)
+    assert upstream.requests == UPSTREAM_RETRIES + 1
+
+def test_closing_the_session_drops_its_connections(upstream):
+    session = upstream_session()
+    fetch_catalog(url(upstream), list)
+    close_upstream_session()
+    assert upstream_session() is not session
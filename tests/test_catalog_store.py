@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from catalog import CatalogStore, load_validators
+
+@pytest.fixture
+def store(tmp_path):
+    return CatalogStore(str(tmp_path / "catalog.bin"))
+
+def test_load_fetches_and_writes_snapshot(store, upstream, cards):
+    assert len(store.load()) == len(cards)
+    assert os.path.exists(store.path)
+    assert load_validators(store.path)["etag"] == upstream.etag
+
+def test_refresh_not_modified_keeps_version(store, upstream):
+    version = store.load().version
+    assert store.refresh()
+    assert upstream.not_modified == 1
+    assert store.current.version == version
+    assert store.stats["last_delta"] == {"added": 0, "removed": 0, "changed": 0}
+
+def test_refresh_publishes_upstream_change(store, upstream, cards):
+    seen = []
+    store.on_refresh(lambda old, new: seen.append((len(old), len(new))))
+    store.derive("count", len)
+    store.load()
+    upstream.set_cards(cards[:-5])
+    assert store.refresh()
+    assert len(store.current) == len(cards) - 5
+    assert store.current.derived["count"] == len(cards) - 5
+    # The first fetch at load() counts as a refresh from the empty catalog
+    assert seen == [(0, len(cards)), (len(cards), len(cards) - 5)]
+
+def test_refresh_failure_keeps_serving_current(store, upstream, cards):
+    catalog = store.load()
+    upstream.fail = 100
+    assert not store.refresh()
+    assert store.current is catalog
+    assert store.stats["failures"] == 1 and store.stats["last_error"]
+
+def test_load_falls_back_to_snapshot_when_upstream_is_down(store, upstream, cards):
+    store.load()
+    upstream.fail = 100
+    requests_before = upstream.requests
+    restarted = CatalogStore(store.path)
+    assert len(restarted.load()) == len(cards)
+    assert upstream.requests == requests_before
+
+def test_load_without_snapshot_or_upstream_is_empty(store, upstream):
+    upstream.fail = 100
+    assert len(store.load()) == 0
+
+def test_refresh_swaps_whole_catalogs(store, upstream, cards):
+    # A request keeps the catalog it started with, derived data included, while a refresh publishes another
+    store.derive("names", lambda catalog: [catalog.cards.name(pos) for pos in range(len(catalog))])
+    held = store.load()
+    names = list(held.derived["names"])
+    upstream.set_cards(cards[5:])
+    assert store.refresh()
+    assert store.current is not held
+    assert len(held) == len(cards) and held.derived["names"] == names
+    assert store.current.derived["names"] == names[5:]
+
+def test_other_worker_adopts_the_snapshot_without_fetching(store, upstream, cards):
+    other = CatalogStore(store.path)
+    seen = []
+    other.on_refresh(lambda old, new: seen.append(new))
+    store.load()
+    other.load()
+    upstream.set_cards(cards[:-3])
+    assert store.refresh()
+    requests_before = upstream.requests
+    assert other.refresh()
+    assert upstream.requests == requests_before
+    assert other.current.version == store.current.version and len(other.current) == len(cards) - 3
+    # Only the worker that fetched runs the once-per-change listeners
+    assert seen == []
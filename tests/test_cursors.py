@@ -0,0 +1,70 @@
+import pytest
+
+from search import encode_cursor
+
+@pytest.fixture(scope="module")
+def app_module():
+    import app
+    return app
+
+@pytest.fixture(scope="module")
+def client(app_module):
+    return app_module.app.test_client()
+
+QUERY = {"search": "", "type": "", "atk": ""}
+
+def ids(response):
+    assert response.status_code == 200
+    return [card["id"] for card in response.get_json()["cards"]]
+
+def walk(client, **params):
+    """Every page of a /shop/cards query, following the cursors."""
+    pages = [client.get("/shop/cards", query_string=params).get_json()]
+    while pages[-1]["next"]:
+        pages.append(client.get("/shop/cards", query_string={"cursor": pages[-1]["next"]}).get_json())
+    return pages
+
+def test_cursors_walk_the_whole_result_once(app_module, client):
+    catalog = app_module.catalog_store.current
+    pages = walk(client, **QUERY)
+    assert len(pages) == len(catalog) // 50
+    assert [card["id"] for page in pages for card in page["cards"]] == list(catalog.cards.ids)
+    assert not any(page.get("restart") for page in pages)
+
+def test_cursor_pages_reuse_the_cached_result(app_module, client):
+    before = app_module.query_cache.stats()
+    pages = walk(client, search="dr")
+    after = app_module.query_cache.stats()
+    assert after["misses"] - before["misses"] <= 1
+    assert after["hits"] - before["hits"] >= len(pages) - 1
+
+def test_page_numbers_match_the_cursors(client):
+    pages = walk(client, **QUERY)
+    for number, page in enumerate(pages):
+        assert ids(client.get("/shop/cards", query_string=dict(QUERY, page=number))) == [card["id"] for card in page["cards"]]
+
+@pytest.mark.parametrize("page", ["abc", "-3", ""])
+def test_bad_page_numbers_give_the_first_page(client, page):
+    first = ids(client.get("/shop/cards"))
+    assert ids(client.get("/shop/cards", query_string={"page": page})) == first
+    assert ids(client.get("/load_cards", query_string={"page": page}))
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    encode_cursor("", "", "", 50),
+    encode_cursor("", "", 7, 50, "v"),
+    encode_cursor("", "", "", "x", "v"),
+])
+def test_invalid_cursor_is_rejected(client, cursor):
+    response = client.get("/shop/cards", query_string={"cursor": cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "invalid cursor"}
+
+def test_cursor_from_another_catalog_version_restarts(client):
+    first = client.get("/shop/cards").get_json()
+    response = client.get("/shop/cards", query_string={"cursor": encode_cursor("", "", "", 50, "0123456789ab")})
+    page = response.get_json()
+    assert page["restart"] is True
+    assert page["cards"] == first["cards"]
+    assert page["facets"] == first["facets"]
+    assert page["next"] == first["next"]
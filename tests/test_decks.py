@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from catalog import Catalog, normalize_card
+from decks import MAX_LINE, Deck, DeckError, DeckRules, decode_deck, encode_deck, from_ydk, to_ydk
+from pricing import PriceTable, godly_tier_cards
+
+@pytest.fixture(scope="module")
+def client():
+    import app
+    return app.app.test_client()
+
+@pytest.fixture
+def rules(cards):
+    cards[0].update(name=godly_tier_cards[0], type="Spell Card")
+    cards[1].update(name=godly_tier_cards[1], type="Effect Monster")
+    catalog = Catalog([normalize_card(card) for card in cards])
+    return DeckRules(catalog, PriceTable(catalog.cards))
+
+def first(rules, extra):
+    return next(rules.cards.ids[pos] for pos in range(len(rules.cards))
+                if rules.extra[pos] == extra and rules.playable[pos] and not rules.godly[pos])
+
+def test_copies_count_across_main_and_extra(rules):
+    xyz = first(rules, True)
+    assert rules.validate([], [xyz] * 3) == []
+    assert rules.validate([], [xyz] * 4) == [f"At most 3 copies of {rules.cards.name(rules.positions[xyz])}"]
+
+def test_godly_limit_counts_the_whole_deck(rules):
+    godly = [rules.cards.ids[pos] for pos in range(len(rules.cards)) if rules.godly[pos]]
+    assert len(godly) == 2
+    assert rules.validate(godly[:1], []) == []
+    assert rules.validate(godly, []) == ["At most 1 godly card per deck"]
+
+def test_replacing_a_slot_frees_its_copy(rules):
+    card = first(rules, False)
+    deck = Deck(rules)
+    assert deck.fill([card] * 3, []) == []
+    pos = rules.positions[card]
+    assert deck.check("main", 3, pos)
+    assert deck.check("main", 2, pos) is None
+
+def test_cards_go_in_their_own_section(rules):
+    assert rules.validate([first(rules, True)], []) and rules.validate([], [first(rules, False)])
+
+@pytest.mark.parametrize("line", ["²", "１２", "9" * 20, "9" * 5000, "-1"])
+def test_ydk_rejects_lines_that_are_not_card_ids(line):
+    with pytest.raises(DeckError, match="Line 2"):
+        from_ydk(f"#main\n{line}\n")
+
+def test_ydk_round_trip():
+    assert from_ydk(to_ydk([1, 2, 2], [3])) == ([1, 2, 2], [3])
+
+def test_ydk_import_rejects_bad_ids_with_400(client):
+    response = client.post("/api/player/deck/import", json={"ydk": "#main\n²"})
+    assert response.status_code == 400
+    assert "not a card id" in response.get_json()["error"]
+
+def test_convert_gives_one_result_per_line(client):
+    long_line = b'{"main": [], "extra": [], "pad": "' + b"x" * (3 * MAX_LINE) + b'"}'
+    body = long_line + b"\n" + b'{"main": [1], "extra": []}\n' + long_line
+    lines = client.post("/api/decks/convert?to=json", data=body).get_data().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"error": f"Line is longer than {MAX_LINE} bytes"},
+        {"main": [1], "extra": []},
+        {"error": f"Line is longer than {MAX_LINE} bytes"},
+    ]
+
+@pytest.mark.parametrize("ids", [[-1], [2 ** 63], [True]])
+def test_convert_rejects_ids_that_are_not_card_ids(client, ids):
+    body = json.dumps({"main": ids, "extra": []}).encode() + b"\n"
+    result = json.loads(client.post("/api/decks/convert?to=code", data=body).get_data())
+    assert result == {"error": "A deck needs a code, a ydk text or main and extra lists of card ids"}
+
+def test_deck_code_round_trip():
+    assert decode_deck(encode_deck([5, 5, 2 ** 63 - 1], [7])) == ([5, 5, 2 ** 63 - 1], [7])
+    with pytest.raises(DeckError):
+        encode_deck([-1], [])
@@ -0,0 +1,101 @@
+import io
+import os
+
+import pytest
+import requests
+from PIL import Image
+
+from images import FORMATS, ORIGINAL, THUMBNAIL_SIZES, ImageCache, prefetch
+
+@pytest.fixture(scope="module")
+def client():
+    import app
+    return app.app.test_client()
+
+@pytest.fixture
+def card_id(client, upstream):
+    import app
+    catalog = app.catalog_store.current
+    return catalog.cards.ids[len(catalog) - 1]
+
+def test_thumbnail_webp_when_accepted(client, card_id, upstream):
+    response = client.get(f"/img/{card_id}/grid", headers={"Accept": "image/avif,image/webp,*/*"})
+    assert response.status_code == 200
+    assert response.mimetype == "image/webp"
+    assert response.cache_control.immutable and "Accept" in response.vary
+    with Image.open(io.BytesIO(response.data)) as image:
+        assert image.format == "WEBP" and image.width == THUMBNAIL_SIZES["grid"]
+
+def test_thumbnail_jpeg_otherwise_and_cached(client, card_id, upstream):
+    first = client.get(f"/img/{card_id}/deck", headers={"Accept": "image/*"})
+    assert first.mimetype == "image/jpeg"
+    with Image.open(io.BytesIO(first.data)) as image:
+        assert image.format == "JPEG" and image.width == THUMBNAIL_SIZES["deck"]
+    fetched = upstream.image_requests
+    again = client.get(f"/img/{card_id}/shop")
+    assert again.status_code == 200
+    # Every size is cut from the one cached original
+    assert upstream.image_requests == fetched
+    assert client.get(f"/img/{card_id}/deck", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+def test_thumbnail_unknown_card_or_size(client, card_id):
+    assert client.get(f"/img/{card_id}/poster").status_code == 404
+    assert client.get("/img/1/grid").status_code == 404
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=2500)
+    for card_id in (1, 2, 3):
+        cache.write(cache.path(card_id, "deck", "jpeg"), b"x" * 1000)
+    assert cache.read(cache.path(1, "deck", "jpeg")) is None
+    assert cache.read(cache.path(3, "deck", "jpeg")) == b"x" * 1000
+
+def test_prefetch_keeps_thumbnails_only_and_resumes(tmp_path, client, upstream):
+    import app
+    cards = app.catalog_store.current.cards
+    cache = ImageCache(str(tmp_path), max_bytes=1 << 30)
+    stats = prefetch(cache, cards, positions=range(10), fetchers=2, workers=1)
+    assert stats["images"] == 10 * len(THUMBNAIL_SIZES) * len(FORMATS) and not stats["stopped"]
+    assert upstream.image_requests == 10
+    assert not os.path.exists(os.path.join(str(tmp_path), ORIGINAL))
+    assert cache.total == stats["bytes"]
+    # A second run finds everything on disk
+    assert prefetch(cache, cards, positions=range(10), fetchers=2, workers=1)["cards"] == 0
+    assert upstream.image_requests == 10
+
+def test_prefetch_stops_when_the_catalog_does_not_fit(tmp_path, client, upstream):
+    import app
+    cards = app.catalog_store.current.cards
+    cache = ImageCache(str(tmp_path), max_bytes=1 << 20)
+    stats = prefetch(cache, cards, fetchers=1, workers=1)
+    assert stats["stopped"] and stats["estimated_bytes"] > cache.max_bytes
+    # Only the first chunk was rendered, and none of it was evicted
+    assert stats["done"] < stats["cards"] and cache.evictions == 0
+
+def test_upstream_failure_is_a_502_and_not_cached(client, upstream, monkeypatch):
+    import app
+    import images
+    catalog = app.catalog_store.current
+    card_id = catalog.cards.ids[len(catalog) - 2]
+    for size, fmt in ((ORIGINAL, "jpg"), ("grid", "jpeg")):
+        app.image_cache.discard(app.image_cache.path(card_id, size, fmt))
+
+    def unavailable(url):
+        raise requests.ConnectionError("upstream down")
+
+    monkeypatch.setattr(images, "fetch_image", unavailable)
+    assert client.get(f"/img/{card_id}/grid").status_code == 502
+    monkeypatch.undo()
+    response = client.get(f"/img/{card_id}/grid")
+    assert response.status_code == 200 and response.mimetype == "image/jpeg"
+
+def test_cache_recency_survives_a_restart(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=2500)
+    first, second = cache.path(1, "deck", "jpeg"), cache.path(2, "deck", "jpeg")
+    cache.write(first, b"x" * 1000)
+    cache.write(second, b"x" * 1000)
+    # Card 1 was used last (recency is the mtime, touched on every hit)
+    os.utime(second, (1, 1))
+    restarted = ImageCache(str(tmp_path), max_bytes=2500)
+    assert restarted.total == 2000
+    restarted.write(restarted.path(3, "deck", "jpeg"), b"x" * 1000)
+    assert restarted.read(second) is None and restarted.read(first) == b"x" * 1000
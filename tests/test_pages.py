@@ -0,0 +1,99 @@
+import gzip
+import json
+
+import pytest
+
+from compression import ENCODINGS, MIN_SIZE, brotli
+
+@pytest.fixture(scope="module")
+def app_module():
+    import app
+    return app
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+PAGES = {"/": "main", "/second": "second", "/third": "third"}
+
+@pytest.mark.parametrize("path", PAGES)
+def test_page_is_served_pre_rendered(app_module, client, path):
+    catalog = app_module.catalog_store.current
+    response = client.get(path)
+    assert response.status_code == 200
+    assert response.mimetype == "text/html"
+    assert response.get_data() == catalog.derived["pages"][PAGES[path]].variants["identity"]
+    assert response.cache_control.no_cache
+
+def test_deck_builder_points_at_the_current_sprites(app_module, client):
+    version = app_module.catalog_store.current.version
+    assert f"/sprites.{version}.json".encode() in client.get("/third").get_data()
+
+@pytest.mark.parametrize("path", PAGES)
+def test_unchanged_page_answers_304(client, path):
+    etag = client.get(path).headers["ETag"]
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert not response.get_data()
+
+def test_pages_are_rendered_again_for_a_new_catalog(app_module, client, upstream, cards):
+    store = app_module.catalog_store
+    before = client.get("/third")
+    main_etag = client.get("/").headers["ETag"]
+    try:
+        upstream.set_cards(cards[:-1])
+        assert store.refresh()
+        after = client.get("/third", headers={"If-None-Match": before.headers["ETag"]})
+        assert after.status_code == 200
+        assert after.headers["ETag"] != before.headers["ETag"]
+        assert f"/sprites.{store.current.version}.json".encode() in after.get_data()
+        # Pages that don't embed the version keep their ETag, so browsers keep their copy
+        assert client.get("/", headers={"If-None-Match": main_etag}).status_code == 304
+    finally:
+        upstream.set_cards(cards)
+        assert store.refresh()
+        app_module.sprite_sheets._queue.join()
+    assert client.get("/third").get_data() == before.get_data()
+
+def decompress(body, encoding):
+    if encoding == "br":
+        return brotli.decompress(body)
+    return gzip.decompress(body) if encoding == "gzip" else body
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_page_is_sent_precompressed(app_module, client, encoding):
+    payload = app_module.catalog_store.current.derived["pages"]["main"]
+    response = client.get("/", headers={"Accept-Encoding": encoding})
+    assert response.content_encoding == encoding
+    assert response.get_data() == payload.variants[encoding]
+    assert decompress(response.get_data(), encoding) == payload.variants["identity"]
+    assert response.headers["ETag"] == f'"{payload.etag}-{encoding}"'
+    assert "Accept-Encoding" in response.vary
+
+def test_each_encoding_has_its_own_etag(client):
+    etag = client.get("/", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    assert client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+    response = client.get("/", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.content_encoding is None
+
+def test_client_preference_wins(client):
+    response = client.get("/", headers={"Accept-Encoding": "br;q=0.5, gzip"})
+    assert response.content_encoding == "gzip"
+    response = client.get("/", headers={"Accept-Encoding": "gzip;q=0, identity"})
+    assert response.content_encoding is None
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_large_json_is_compressed_on_the_fly(client, encoding):
+    plain = client.get("/load_cards")
+    assert len(plain.get_data()) >= MIN_SIZE
+    response = client.get("/load_cards", headers={"Accept-Encoding": encoding})
+    assert response.content_encoding == encoding
+    assert "Accept-Encoding" in response.vary
+    assert json.loads(decompress(response.get_data(), encoding)) == plain.get_json()
+
+def test_small_json_is_sent_as_is(client):
+    response = client.get("/suggest", query_string={"q": "qqqqqq"}, headers={"Accept-Encoding": "gzip"})
+    assert len(response.get_data()) < MIN_SIZE
+    assert response.content_encoding is None
+    assert response.get_json() == {"suggestions": []}
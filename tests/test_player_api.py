@@ -0,0 +1,76 @@
+import pytest
+
+from players import MAX_IMPORT_VALUE, MAX_INTEGER
+
+@pytest.fixture
+def player():
+    """A test client with its own cookie jar, i.e. a brand new player."""
+    import app
+    return app.app.test_client()
+
+@pytest.fixture(scope="module")
+def shop():
+    """``(cheap, other)`` main-deck card ids that cost 500 coins."""
+    import app
+    catalog = app.catalog_store.current
+    prices, rules = catalog.derived["prices"], catalog.derived["decks"]
+    cheap = [catalog.cards.ids[pos] for pos in range(len(catalog))
+             if prices.price[pos] == 500 and not rules.extra[pos] and rules.playable[pos]]
+    return cheap[0], cheap[1]
+
+def test_new_player_gets_a_cookie_and_an_empty_profile(player):
+    response = player.get("/api/player")
+    assert "player_id=" in response.headers["Set-Cookie"]
+    assert response.get_json() == {"coins": 0, "click_value": 1, "seq": 0, "owned": [],
+                                   "deck": {"main": [], "extra": []}}
+
+def test_clicks_are_credited_once_per_seq(player):
+    assert player.post("/api/player/clicks", json={"clicks": 10, "seq": 1}).get_json() == {"coins": 10, "seq": 1}
+    assert player.post("/api/player/clicks", json={"clicks": 10, "seq": 1}).get_json() == {"coins": 10, "seq": 1}
+    assert player.post("/api/player/clicks", json={"clicks": 5, "seq": 2}).get_json() == {"coins": 15, "seq": 2}
+    assert player.get("/api/player").get_json()["coins"] == 15
+
+@pytest.mark.parametrize("body", [{"clicks": -1, "seq": 1}, {"clicks": 1.5, "seq": 1}, {"clicks": 1},
+                                  {"clicks": 1, "seq": MAX_INTEGER + 1}, {"clicks": True, "seq": 1}])
+def test_bad_click_batches_are_rejected(player, body):
+    assert player.post("/api/player/clicks", json=body).status_code == 400
+
+def test_import_buy_and_deck(player, shop):
+    cheap, other = shop
+    profile = player.post("/api/player/import", json={"coins": 1000, "cards": []}).get_json()
+    assert profile["coins"] == 1000
+    # A profile with progress can't be imported over
+    assert player.post("/api/player/import", json={"coins": 5, "cards": []}).status_code == 409
+
+    bought = player.post("/api/player/buy", json={"card_id": cheap}).get_json()
+    assert bought == {"coins": 500, "click_value": 8}
+    assert player.post("/api/player/buy", json={"card_id": cheap}).get_json()["error"] == "Card already purchased"
+    assert player.post("/api/player/buy", json={"card_id": 1}).status_code == 404
+    # Clicks pending in the buffer count towards the next purchase
+    player.post("/api/player/clicks", json={"clicks": 1, "seq": 1})
+    assert player.post("/api/player/buy", json={"card_id": other}).get_json()["coins"] == 8
+
+    assert player.put("/api/player/deck", json={"main": [cheap, None, other], "extra": []}).status_code == 200
+    assert player.get("/api/player").get_json()["deck"] == {"main": [cheap, None, other], "extra": []}
+    assert player.put("/api/player/deck", json={"main": "all", "extra": []}).status_code == 400
+
+def test_cards_not_owned_cannot_go_in_a_deck(player, shop):
+    response = player.put("/api/player/deck", json={"main": [shop[0]], "extra": []})
+    assert response.status_code == 400
+
+def test_not_enough_coins(player, shop):
+    assert player.post("/api/player/buy", json={"card_id": shop[0]}).get_json()["error"] == "Not enough coins"
+
+def test_import_is_capped(player):
+    assert player.post("/api/player/import", json={"coins": MAX_IMPORT_VALUE + 1, "cards": []}).status_code == 400
+    assert player.post("/api/player/import", json={"coins": "lots", "cards": []}).status_code == 400
+
+def test_saved_decks(player, shop):
+    player.post("/api/player/import", json={"coins": 600, "cards": []})
+    player.post("/api/player/buy", json={"card_id": shop[0]})
+    result = player.put("/api/player/decks", json={"decks": {
+        "mine": {"main": [shop[0]], "extra": []},
+        "borrowed": {"main": [shop[1]], "extra": []},
+    }}).get_json()
+    assert result["saved"] == ["mine"] and list(result["errors"]) == ["borrowed"]
+    assert player.get("/api/player/decks").get_json() == {"mine": {"main": [shop[0]], "extra": []}}
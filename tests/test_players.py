@@ -0,0 +1,144 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import players
+from players import CLICK_FLUSH_ATTEMPTS, ClickBuffer, SQLitePlayerStore
+
+class FlakyStore(SQLitePlayerStore):
+    """Refuses to write any batch that includes a player in ``broken``."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.broken = set()
+        self.on_load = None
+
+    def apply_clicks(self, deltas):
+        if any(delta[0] in self.broken for delta in deltas):
+            raise RuntimeError("disk full")
+        super().apply_clicks(deltas)
+
+    def click_state(self, player_id):
+        hook, self.on_load = self.on_load, None
+        if hook:
+            hook()
+        return super().click_state(player_id)
+
+@pytest.fixture
+def store(tmp_path):
+    return FlakyStore(str(tmp_path / "players.sqlite3"))
+
+@pytest.fixture
+def buffer(store, monkeypatch):
+    # A reloaded player starts with an empty token bucket; lift the rate limit so every click counts
+    monkeypatch.setattr(players, "MAX_CLICKS_PER_SECOND", 10 ** 9)
+    # A long interval: the tests flush by hand
+    return ClickBuffer(store, interval=3600)
+
+def test_add_flush_forget(store, buffer):
+    assert buffer.add("a", 5, 1) == {"coins": 5, "seq": 1}
+    assert buffer.add("a", 3, 2) == {"coins": 8, "seq": 2}
+    # A replayed batch is not credited again
+    assert buffer.add("a", 3, 2) == {"coins": 8, "seq": 2}
+    assert store.profile("a")["coins"] == 0
+    assert buffer.flush() == 1
+    assert store.profile("a")["coins"] == 8 and store.profile("a")["seq"] == 2
+    assert buffer.stats()["pending_players"] == 0 and "a" not in buffer._state
+    # Once forgotten, the next batch rereads the store, including changes made elsewhere
+    store.import_profile("b", 40, [])
+    buffer.add("b", 1, 1)
+    buffer.flush("b")
+    store.buy("b", 7, 10, 2)
+    buffer.forget("b")
+    assert buffer.add("b", 1, 2) == {"coins": 33, "seq": 2}
+
+def test_failed_delta_is_retried_alone_then_dropped(store, buffer):
+    store.broken.add("bad")
+    buffer.add("bad", 4, 1)
+    buffer.add("good", 2, 1)
+    assert buffer.flush() == 1
+    assert store.profile("good")["coins"] == 2
+    assert buffer.stats()["pending_players"] == 1
+    # Later batches keep adding to the delta that is waiting to be retried
+    assert buffer.add("bad", 1, 2)["coins"] == 5
+    store.broken.clear()
+    assert buffer.flush() == 1
+    assert store.profile("bad")["coins"] == 5
+
+    store.broken.add("bad")
+    buffer.add("bad", 1, 3)
+    for _ in range(CLICK_FLUSH_ATTEMPTS):
+        assert buffer.flush() == 0
+    stats = buffer.stats()
+    assert stats["dropped"] == 1 and stats["pending_players"] == 0
+    assert "bad" not in buffer._state
+
+def test_flush_while_state_is_loading(store, buffer):
+    # Another request credits, flushes and forgets the player while this one reads the store
+    store.on_load = lambda: (buffer.add("a", 2, 1), buffer.flush())
+    assert buffer.add("a", 3, 2)["seq"] == 2
+    assert buffer.flush() == 1
+    assert store.profile("a")["coins"] == 5
+
+def test_flush_during_add(store, buffer, monkeypatch):
+    # A flush from another thread lands while add() reads the clock, between looking the state up
+    # and updating it; it must wait, not forget the state the batch is about to be credited to
+    buffer.add("a", 1, 1)
+    flusher = threading.Thread(target=buffer.flush)
+
+    def clock():
+        if not flusher.is_alive() and not flusher.ident:
+            flusher.start()
+            flusher.join(0.2)
+        return time.time()
+
+    monkeypatch.setattr(players, "time", SimpleNamespace(time=clock, perf_counter=time.perf_counter))
+    assert buffer.add("a", 1, 2)["coins"] == 2
+    flusher.join()
+    buffer.flush()
+    assert store.profile("a")["coins"] == 2
+
+def test_concurrent_add_and_flush(store, buffer):
+    players = [f"p{i}" for i in range(8)]
+    last = {}
+
+    def click(player_id):
+        for seq in range(1, 61):
+            last[player_id] = buffer.add(player_id, 1, seq)["coins"]
+
+    done = threading.Event()
+
+    def flush_forever():
+        while not done.is_set():
+            buffer.flush()
+
+    flusher = threading.Thread(target=flush_forever)
+    flusher.start()
+    clickers = [threading.Thread(target=click, args=(p,)) for p in players]
+    for thread in clickers:
+        thread.start()
+    for thread in clickers:
+        thread.join()
+    done.set()
+    flusher.join()
+    buffer.flush()
+    assert {p: store.profile(p)["coins"] for p in players} == last == {p: 60 for p in players}
+
+def test_flush_thread_survives_errors(store):
+    buffer = ClickBuffer(store, interval=0.01)
+    flush, calls = buffer.flush, []
+
+    def failing_flush(player_id=None):
+        calls.append(player_id)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return flush(player_id)
+
+    buffer.flush = failing_flush
+    buffer.add("a", 1, 1)
+    deadline = time.time() + 5
+    while store.profile("a")["coins"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert store.profile("a")["coins"] == 1
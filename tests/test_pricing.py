@@ -0,0 +1,68 @@
+import pytest
+
+from catalog import Catalog, normalize_card
+from pricing import PriceTable, godly_tier_cards
+
+def reference_price(card):
+    """getCardPrice from the original shop page."""
+    if card["name"] in godly_tier_cards:
+        return 3500000
+    atk = card.get("atk") or 0
+    for limit, price in ((999, 500), (1999, 2000), (2999, 10000), (3999, 25000), (4999, 50000)):
+        if atk <= limit:
+            return price
+    return 100000
+
+def reference_boost(card):
+    """getCardBoost from the original shop page."""
+    if card["name"] in godly_tier_cards:
+        return 10000
+    atk = card.get("atk") or 0
+    if reference_price(card) >= 100000:
+        return 25
+    for limit, boost in ((999, 8), (1999, 16), (2999, 50), (3999, 120), (4999, 250)):
+        if atk <= limit:
+            return boost
+
+@pytest.fixture
+def catalog(cards):
+    # Every bucket edge, plus the godly names
+    monsters = [card for card in cards if "atk" in card]
+    for card, atk in zip(monsters, (0, 999, 1000, 1999, 2000, 2999, 3000, 3999, 4000, 4999, 5000, 9999)):
+        card["atk"] = atk
+    for card, name in zip(cards[20:], godly_tier_cards):
+        card["name"] = name
+    return Catalog([normalize_card(card) for card in cards])
+
+def test_table_matches_the_original_pricing(catalog):
+    table = PriceTable(catalog.cards)
+    for pos in range(len(catalog)):
+        card = catalog.cards[pos]
+        assert (table.price[pos], table.boost[pos]) == (reference_price(card), reference_boost(card)), card
+        assert table.godly[pos] == (card["name"] in godly_tier_cards)
+    assert sum(table.godly) == len(godly_tier_cards)
+
+def test_select_sorts_and_filters(catalog):
+    table = PriceTable(catalog.cards)
+    by_price = table.select("price")
+    assert [table.price[pos] for pos in by_price] == sorted(table.price)
+    assert list(table.select("boost", descending=True)) == list(table.order["boost"])[::-1]
+    picked = table.select("", min_price=2000, max_price=25000, min_boost=50)
+    assert picked == [pos for pos in range(len(catalog))
+                      if 2000 <= table.price[pos] <= 25000 and table.boost[pos] >= 50]
+
+@pytest.fixture(scope="module")
+def client():
+    import app
+    return app.app.test_client()
+
+def test_shop_endpoint(client):
+    import app
+    catalog = app.catalog_store.current
+    page = client.get("/shop?sort=-price&min_boost=16&page=1").get_json()
+    expected = catalog.derived["prices"].select("price", True, min_boost=16)
+    assert page["total"] == len(expected) and page["cards"]
+    assert [card["id"] for card in page["cards"]] == [catalog.cards.ids[pos] for pos in expected[50:100]]
+    assert all(card["price"] == reference_price(card) and card["boost"] == reference_boost(card)
+               for card in page["cards"])
+    assert client.get("/shop?sort=name").status_code == 400
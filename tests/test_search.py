@@ -0,0 +1,70 @@
+import pytest
+
+import search
+from search import ATK_BUCKETS, SearchIndex, atk_bucket
+
+SEARCHES = ["", "a", "dr", "eye", "dragon", "-eyes w", "on 1", "zzz"]
+TYPES = ["", "Effect", "Spell", "Spell Card"]
+ATKS = ["", "2000-2999", "0-999", "not-a-bucket"]
+
+@pytest.fixture(scope="module")
+def client():
+    import app
+    return app.app.test_client()
+
+@pytest.fixture(scope="module")
+def catalog(client):
+    import app
+    return app.catalog_store.current
+
+def linear_scan(catalog, search, type_filter, atk_filter):
+    """The per-request scan the index replaced."""
+    found = []
+    for pos in range(len(catalog)):
+        card = catalog.cards[pos]
+        if search and search not in card["name"].lower():
+            continue
+        if type_filter and card["type"] != type_filter:
+            continue
+        if atk_filter in ATK_BUCKETS and ATK_BUCKETS[atk_bucket(card.get("atk"))] != atk_filter:
+            continue
+        found.append(pos)
+    return found
+
+@pytest.mark.parametrize("search", SEARCHES)
+def test_index_matches_a_linear_scan(catalog, search):
+    index = SearchIndex(catalog.cards)
+    for type_filter in TYPES:
+        for atk_filter in ATKS:
+            expected = linear_scan(catalog, search, type_filter, atk_filter)
+            assert list(index.query(search, type_filter, atk_filter)) == expected, (type_filter, atk_filter)
+
+def test_load_cards_endpoint(client, catalog):
+    page = client.get("/load_cards?search=E&type=Spell").get_json()
+    expected = linear_scan(catalog, "e", "Spell", "")
+    assert expected
+    assert [card["id"] for card in page["cards"]] == [catalog.cards.ids[pos] for pos in expected][:200]
+
+@pytest.mark.parametrize("precompute", [search.FACET_PRECOMPUTE, 10])
+def test_facets_count_what_each_option_would_return(catalog, monkeypatch, precompute):
+    # 10 sends the short searches through the precomputed matrices, the default through the tally
+    monkeypatch.setattr(search, "FACET_PRECOMPUTE", precompute)
+    index = SearchIndex(catalog.cards)
+    for text in SEARCHES:
+        for type_filter in ("", "Effect"):
+            for atk_filter in ("", "2000-2999"):
+                result = index.query_with_facets(text, type_filter, atk_filter)
+                assert list(result.positions) == list(index.query(text, type_filter, atk_filter))
+                assert result.facets == {
+                    "type": {name: len(linear_scan(catalog, text, name, atk_filter)) for name in index.type_names},
+                    "atk": {name: len(linear_scan(catalog, text, type_filter, name)) for name in ATK_BUCKETS},
+                }, (text, type_filter, atk_filter)
+
+def test_facets_come_with_the_first_page_only(client, catalog):
+    first = client.get("/load_cards?atk=0-999").get_json()
+    assert sum(first["facets"]["type"].values()) == len(linear_scan(catalog, "", "", "0-999"))
+    assert first["facets"]["atk"]["0-999"] == len(linear_scan(catalog, "", "", "0-999"))
+    shop = client.get("/shop/cards?type=Spell").get_json()
+    assert shop["facets"]["type"]["Spell"] == len(linear_scan(catalog, "", "Spell", ""))
+    next_page = client.get(f"/shop/cards?cursor={client.get('/shop/cards').get_json()['next']}").get_json()
+    assert next_page["cards"] and "facets" not in next_page
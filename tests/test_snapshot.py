@@ -0,0 +1,46 @@
+import struct
+
+import pytest
+
+from catalog import (SNAPSHOT_SCHEMA, CardTable, CatalogStore, load_snapshot, load_validators, normalize_card,
+                     save_snapshot, save_validators)
+
+@pytest.fixture
+def table(cards):
+    return CardTable.from_dicts(map(normalize_card, cards))
+
+def test_snapshot_round_trip(tmp_path, table):
+    path = str(tmp_path / "catalog.bin")
+    save_snapshot(table, 1234.5, path)
+    loaded, fetched_at = load_snapshot(path)
+    assert fetched_at == 1234.5
+    assert loaded.to_dicts() == table.to_dicts()
+    assert [loaded[pos] for pos in range(len(loaded))] == [table[pos] for pos in range(len(table))]
+    assert loaded.digest() == table.digest()
+
+def test_snapshot_rejects_truncated_and_other_schemas(tmp_path, table):
+    path = str(tmp_path / "catalog.bin")
+    save_snapshot(table, 1.0, path)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:-1])
+    assert load_snapshot(path) is None
+    with open(path, "wb") as f:
+        f.write(data[:4] + struct.pack("<I", SNAPSHOT_SCHEMA + 1) + data[8:])
+    assert load_snapshot(path) is None
+    assert load_snapshot(str(tmp_path / "missing.bin")) is None
+
+def test_validators_round_trip(tmp_path):
+    path = str(tmp_path / "catalog.bin")
+    assert load_validators(path) is None
+    save_validators({"etag": '"abc"', "last_modified": "Sun, 18 Oct 2026 10:00:00 GMT"}, path)
+    assert load_validators(path) == {"etag": '"abc"', "last_modified": "Sun, 18 Oct 2026 10:00:00 GMT"}
+
+def test_startup_from_a_fresh_snapshot_skips_the_upstream(tmp_path, upstream, cards):
+    path = str(tmp_path / "catalog.bin")
+    first = CatalogStore(path).load()
+    requests_before = upstream.requests
+    restarted = CatalogStore(path).load()
+    assert upstream.requests == requests_before
+    assert restarted.version == first.version and len(restarted) == len(cards)
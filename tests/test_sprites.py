@@ -0,0 +1,61 @@
+import os
+
+import pytest
+import requests
+
+from sprites import SpriteSheets
+
+class BrokenImages:
+    """Wraps an ImageCache; thumbnails of cards in ``broken`` fail like an upstream outage."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.broken = set()
+
+    def thumbnail(self, card_id, url, size, fmt):
+        if card_id in self.broken:
+            raise requests.ConnectionError("upstream down")
+        return self.cache.thumbnail(card_id, url, size, fmt)
+
+@pytest.fixture(scope="module")
+def app_module():
+    import app
+    return app
+
+@pytest.fixture
+def catalog(app_module):
+    return app_module.catalog_store.current
+
+def test_sheet_with_missing_tiles_is_not_stored(tmp_path, app_module, catalog, upstream):
+    images = BrokenImages(app_module.image_cache)
+    sheets = SpriteSheets(images, root=str(tmp_path))
+    layout = catalog.derived["sprites"]
+    images.broken.add(catalog.cards.ids[layout.sheets[0][0]])
+    assert sheets.build(catalog, layout) == 1
+    assert sheets.sheet(layout, 0, "jpeg") is None
+    assert all(sheets.sheet(layout, sheet, fmt) for sheet in range(1, len(layout.sheets)) for fmt in ("jpeg", "webp"))
+    # Once the upstream is back, the next build fills in only what is missing
+    images.broken.clear()
+    assert sheets.build(catalog, layout) == 0
+    assert sheets.sheet(layout, 0, "webp")
+    with pytest.raises(IndexError):
+        sheets.sheet(layout, len(layout.sheets), "jpeg")
+
+def test_sheet_route_never_builds_in_the_request(app_module, catalog, upstream, monkeypatch):
+    client = app_module.app.test_client()
+    sheets = app_module.sprite_sheets
+    submitted = []
+    monkeypatch.setattr(sheets, "submit", submitted.append)
+    url = f"/sprites/{catalog.version}/0"
+    layout = catalog.derived["sprites"]
+    path = sheets.path(catalog.version, 0, "jpeg")
+    if os.path.exists(path):
+        os.remove(path)
+    response = client.get(url)
+    assert response.status_code == 503 and submitted == [catalog]
+    assert upstream.image_requests == 0
+    sheets.build(catalog, layout)
+    response = client.get(url)
+    assert response.status_code == 200 and response.mimetype == "image/jpeg"
+    assert response.cache_control.immutable
+    assert client.get(f"/sprites/{catalog.version}/{len(layout.sheets)}").status_code == 404
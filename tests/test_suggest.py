@@ -0,0 +1,45 @@
+import pytest
+
+from search import normalize_name
+
+@pytest.fixture(scope="module")
+def client():
+    import app
+    return app.app.test_client()
+
+@pytest.fixture(scope="module")
+def catalog(client):
+    import app
+    return app.catalog_store.current
+
+def suggest(client, query, **params):
+    response = client.get("/suggest", query_string=dict(q=query, **params))
+    assert response.status_code == 200
+    return [(entry["name"], entry["id"]) for entry in response.get_json()["suggestions"]]
+
+def test_whole_name_comes_first(client, catalog):
+    name, card_id = catalog.cards.name(7), catalog.cards.ids[7]
+    assert suggest(client, name.upper())[0] == (name, card_id)
+
+def test_prefix_of_any_word_name_starts_first(client):
+    found = suggest(client, "Dra", limit=20)
+    names = [normalize_name(name) for name, _ in found]
+    assert len(found) == 20
+    assert all(any(word.startswith("dra") for word in name.split()) for name in names)
+    starts = [name.startswith("dra") for name in names]
+    # Names starting with the query, then names with a later word starting with it
+    assert starts == sorted(starts, reverse=True)
+
+def test_typos_fall_back_to_close_spellings(client):
+    for typo, word in (("blue-eyes whte", "white"), ("dragn", "dragon"), ("magican", "magician")):
+        found = suggest(client, typo)
+        assert found and all(word in normalize_name(name) for name, _ in found), typo
+    assert suggest(client, "qqqqqq") == []
+
+@pytest.mark.parametrize("limit", ["0", "21", "many"])
+def test_limit_is_bounded(client, limit):
+    assert client.get("/suggest", query_string={"q": "dr", "limit": limit}).status_code == 400
+
+def test_empty_and_overlong_queries(client):
+    assert suggest(client, "") == [] and suggest(client, "   ") == []
+    assert suggest(client, "dragon " * 100) == suggest(client, ("dragon " * 100)[:64])